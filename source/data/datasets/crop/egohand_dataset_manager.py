@@ -170,8 +170,6 @@ def create_dataset(videos_list=None, savepath=None, resize_rate=1.0, heigth_shri
     be exploited
     :param im_reg: object used to regularize the images
     :param heat_reg: object used to regularize the heatmaps"""
-    # approximation_ratio = resize_rate / max(heigth_shrink_rate, width_shrink_rate)
-    approximation_ratio = 0.05
     if savepath is None:
         basedir = resources_path(os.path.join("hands_bounding_dataset", "egohands_tranformed"))
     else:
@@ -195,8 +193,7 @@ def create_dataset(videos_list=None, savepath=None, resize_rate=1.0, heigth_shri
                 frame = imresize(frame, resize_rate)
                 frame = __add_padding(frame, frame.shape[1] - (frame.shape[1]//width_shrink_rate)*width_shrink_rate,
                                       frame.shape[0] - (frame.shape[0] // heigth_shrink_rate) * heigth_shrink_rate)
-                heat = __create_ego_heatmap(frame, labels[i], heigth_shrink_rate, width_shrink_rate,
-                                            resize_rate, approximation_ratio)
+                heat = __create_ego_heatmap(frame, labels[i], heigth_shrink_rate, width_shrink_rate, resize_rate)
                 frame = im_reg.apply(frame)
                 heat = heat_reg.apply(heat)
                 fr_to_save['frame'] = frame
@@ -291,64 +288,12 @@ def __read_frame(path):
     return matcontent['frame'], __heatmap_uint8_to_float32(matcontent['heatmap'])
 
 
-def __create_ego_heatmap(frame, label, heigth_shrink_rate, width_shrink_rate, resize_rate, approx):
-    newlab = [[[p[1] * resize_rate * 480/720, p[0] * resize_rate * 640/1280] for p in l] for l in label]
-    newlab = [[[p[0] // heigth_shrink_rate, p[1] // width_shrink_rate] for p in l] for l in newlab]
-    newlab = [np.array(lab, dtype=np.int32) for lab in newlab]
-    heat = np.zeros([int(frame.shape[0] / heigth_shrink_rate), int(frame.shape[1] / width_shrink_rate)])
-    squares = __squares_from_labels(newlab)
-    for i in range(len(squares)):
-        square = squares[i]
-        up, down, left, right = __get_bounds(square)
-        h = up
-
-        h_incr = int(1 + (down - up) * approx)
-        j_incr = int(1 + (right - left) * approx)
-        while up <= h <= down-1:
-            j = left
-            while left <= j <= right-1:
-                if poly.fast_is_inside(np.array([h, j]), np.array(newlab[i])):
-                    end_h = h + h_incr
-                    end_j = j + j_incr
-                    if end_h > heat.shape[0]:
-                        end_h = heat.shape[0]
-                    if end_j > heat.shape[1]:
-                        end_j = heat.shape[1]
-                    heat[h:end_h, j:end_j] = 1
-                j += j_incr
-            h += h_incr
-    return heat
-
-
-def __get_bounds(coord):
-    """given an array of 4 coordinates (x,y), simply computes and
-    returns the highest and lowest vertical and horizontal points"""
-    if len(coord) != 4:
-        raise AttributeError("coord must be a set of 4 coordinates")
-    x = [c[0] for c in coord]
-    y = [c[1] for c in coord]
-    up = np.min(x)
-    down = np.max(x)
-    left = np.min(y)
-    right = np.max(y)
-    return up, down, left, right
-
-
-def __get_coord_from_labels(lista):
-    list_x = [p[0] for p in lista]
-    list_y = [p[1] for p in lista]
-    min_x = np.min(list_x)
-    max_x = np.max(list_x)
-    min_y = np.min(list_y)
-    max_y = np.max(list_y)
-    return [[min_x, min_y], [min_x, max_y], [max_x, min_y], [max_x, max_y]]
-
-
-def __squares_from_labels(label):
-    squares = []
-    for l in label:
-        squares.append(__get_coord_from_labels(l))
-    return squares
+def __create_ego_heatmap(frame, label, heigth_shrink_rate, width_shrink_rate, resize_rate):
+    # polygons are (x, y) in 1280x720 frames, bring them to (row, col) heatmap coordinates
+    scale = np.array([resize_rate * 480 / 720 / heigth_shrink_rate, resize_rate * 640 / 1280 / width_shrink_rate])
+    newlab = [np.floor(np.asarray(lab, dtype=np.float64)[:, ::-1] * scale) for lab in label]
+    shape = [int(frame.shape[0] / heigth_shrink_rate), int(frame.shape[1] / width_shrink_rate)]
+    return poly.rasterize_polygons(newlab, shape).astype(np.float64)
 
 
 def __load_egohand_video(dir, one_out_of=10):
@@ -365,34 +310,17 @@ def __load_egohand_video(dir, one_out_of=10):
 
 def __load_egohand_mat(filepath, one_out_of=10):
     mat_cont = scio.loadmat(filepath)
+    step = max(int(one_out_of), 1)
     labels = []
     n = len(mat_cont['polygons']['myleft'][0])
     for i in range(n):
         single_lab = []
-        single_lab.append(mat_cont['polygons']['myleft'][0][i].tolist())
-        single_lab.append(mat_cont['polygons']['myright'][0][i].tolist())
-        single_lab.append(mat_cont['polygons']['yourleft'][0][i].tolist())
-        single_lab.append(mat_cont['polygons']['yourright'][0][i].tolist())
-        for lab in single_lab:
-            n = len(lab)
-            j = 0
-            while j < n:
-                if j % one_out_of != 0:
-                    lab.pop(j)
-                    n -= 1
-                j += 1
+        for hand in ('myleft', 'myright', 'yourleft', 'yourright'):
+            lab = np.asarray(mat_cont['polygons'][hand][0][i], dtype=np.float64)
+            # hands out of the frame have empty polygons
+            if lab.size > 0:
+                single_lab.append(lab.reshape(-1, 2)[::step])
         labels.append(single_lab)
-    for l in labels:
-        try:
-            while True:
-                l.remove([[]])
-        except ValueError:
-            pass
-        try:
-            while True:
-                l.remove([])
-        except ValueError:
-            pass
     return labels
 
 
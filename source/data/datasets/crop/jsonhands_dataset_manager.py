@@ -167,6 +167,25 @@ def read_dataset(path=jsonhands_path(), verbosity=0, test_vids=None):
     return frames, heatmaps, t_frames, t_heatmaps
 
 
+def read_dataset_batches(path=jsonhands_path(), batch_size=32):
+    """
+    Read the dataset from disk a batch at a time, so that it never has to fit in memory.
+    :param path: the directory of the dataset
+    :param batch_size: the number of samples of each batch
+    :return: a generator of (frames, heatmaps) lists of up to batch_size samples
+    """
+    basedir = crops_path() if path is None else path
+    samples = sorted(os.listdir(basedir))
+    for start in range(0, len(samples), batch_size):
+        frames = []
+        heatmaps = []
+        for name in samples[start:start + batch_size]:
+            matcontent = scio.loadmat(os.path.join(basedir, name))
+            frames.append(matcontent['frame'])
+            heatmaps.append(__heatmap_uint8_to_float32(matcontent['heatmap']))
+        yield frames, heatmaps
+
+
 def __matches(s, leave_out):
     for stri in leave_out:
         if s.startswith(stri + "_"):
@@ -0,0 +1,114 @@
+import sqlite3
+from threading import Lock
+
+from data.datasets.framedata_management.naming import *
+
+# contributors whose nick contains one of these are not ranked
+RANKING_FILTER = ('dio', 'd1o', 'd10', 'anonymous', 'culo')
+
+
+def read_contributors_file(path=contributors):
+    """
+    Read the counts of the old text contributors file, a "nick count" line for each contributor
+    :return: a dictionary with the number of labeled frames of each contributor
+    """
+    counts = {}
+    if not os.path.exists(path):
+        return counts
+    with open(path, "r") as contribs:
+        for line in contribs:
+            tokens = line.split()
+            if len(tokens) == 2:
+                counts[tokens[0]] = int(tokens[1])
+    return counts
+
+
+def ranking_lines(ranked, rank_width=16):
+    """
+    Format the ranking of the top contributors, as shown at the end of a labeling session.
+    :param ranked: the list of (nick, count) of the top contributors, best first
+    :param rank_width: the number of ranking lines
+    :return: the list of the rank_width lines of the ranking
+    """
+    lines = ['{}. {} {}'.format(i + 1, nick, count) for i, (nick, count) in enumerate(ranked[0:rank_width])]
+    lines += ['{}.'.format(i + 1) for i in range(len(lines), rank_width)]
+    return lines
+
+
+class ContributorStore:
+    """
+    Number of labeled frames of each contributor, kept in a SQLite database.
+    Increments are single atomic upserts on the nick primary key, and the leaderboard
+    is read through an index on the counts and cached until the database changes
+    (in this or any other process).
+    The first time the database is created, the counts of the old text file are imported.
+    """
+    def __init__(self, path=contributors_db, legacy_path=contributors):
+        """
+        :param path: the path of the SQLite database
+        :param legacy_path: the text contributors file to import when the database is created
+        """
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.lock = Lock()
+        self.leaderboards = {}
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                created = self.connection.execute("SELECT name FROM sqlite_master "
+                                                  "WHERE type = 'table' AND name = 'contributors'").fetchone() is None
+                if created:
+                    self.connection.execute("CREATE TABLE contributors (nick TEXT PRIMARY KEY, "
+                                            "count INTEGER NOT NULL)")
+                    self.connection.execute("CREATE INDEX contributors_count ON contributors (count)")
+                    self.connection.executemany("INSERT INTO contributors VALUES (?, ?)",
+                                                read_contributors_file(legacy_path).items())
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def increment(self, nick, amount=1):
+        with self.lock:
+            self.connection.execute("INSERT INTO contributors VALUES (?, ?) "
+                                    "ON CONFLICT (nick) DO UPDATE SET count = count + excluded.count",
+                                    (nick, amount))
+
+    def count(self, nick):
+        with self.lock:
+            row = self.connection.execute("SELECT count FROM contributors WHERE nick = ?", (nick,)).fetchone()
+        return 0 if row is None else row[0]
+
+    def counts(self):
+        """
+        :return: a dictionary with the number of labeled frames of each contributor
+        """
+        with self.lock:
+            return dict(self.connection.execute("SELECT nick, count FROM contributors"))
+
+    def __version(self):
+        # data_version changes with the commits of other connections, total_changes with ours
+        return self.connection.execute("PRAGMA data_version").fetchone()[0], self.connection.total_changes
+
+    def leaderboard(self, rank_width=16, filter_list=RANKING_FILTER):
+        """
+        :param rank_width: the number of contributors
+        :param filter_list: contributors whose nick contains one of these are not ranked
+        :return: the list of (nick, count) of the top rank_width contributors, best first
+        """
+        key = (rank_width, tuple(filter_list))
+        with self.lock:
+            version = self.__version()
+            cached = self.leaderboards.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            query = "SELECT nick, count FROM contributors"
+            if len(filter_list) > 0:
+                query += " WHERE " + " AND ".join(["instr(lower(nick), ?) = 0"] * len(filter_list))
+            query += " ORDER BY count DESC LIMIT ?"
+            ranked = self.connection.execute(query, tuple(filter_list) + (rank_width,)).fetchall()
+            self.leaderboards[key] = (version, ranked)
+            return ranked
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -1,27 +1,147 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, get_ident
+
 from data.datasets.framedata_management.naming import *
 from data.datasets.io.image_loader import save_image_from_matrix
 import data.datasets.io.hand_io as hio
 import os
 
 
+def cached_frame_path(vidname, frameno):
+    return os.path.join(get_tmp_dir_from_vidname(vidname), cached_frame_name(vidname, frameno))
+
+
 def cache_frame(frame):
     vidname = get_vidname(frame)
     frameno = get_frameno(frame)
-    tmpdir = get_tmp_dir_from_vidname(vidname)
-    cached_frame = os.path.join(tmpdir, cached_frame_name(vidname, frameno))
+    cached_frame = cached_frame_path(vidname, frameno)
     if os.path.isfile(cached_frame):
         return cached_frame
     framedata, _ = hio.load(get_complete_frame_path(frame))
-    save_image_from_matrix(framedata, cached_frame)
+    # the web server must never see a partially written image
+    partial = os.path.splitext(cached_frame)[0] + ".%d.%d.part.png" % (os.getpid(), get_ident())
+    save_image_from_matrix(framedata, partial)
+    os.replace(partial, cached_frame)
     return cached_frame
 
 
 def uncache_frame(frame):
     vidname = get_vidname(frame)
     frameno = get_frameno(frame)
-    tmpdir = get_tmp_dir_from_vidname(vidname)
-    cached_frame = os.path.join(tmpdir, cached_frame_name(vidname, frameno))
+    cached_frame = cached_frame_path(vidname, frameno)
     if not os.path.isfile(cached_frame):
         return False
     os.remove(cached_frame)
     return True
+
+
+class FrameImageCache:
+    """
+    Size bounded LRU cache of the frame images served to the labeling site.
+    Images are the files written by cache_frame, so they are still served by the web server,
+    but they are kept after a labeler leaves a frame and can be encoded in advance
+    by a background thread (prefetch), so that serving a frame is usually a hit.
+    Frames given to a labeler are pinned and never evicted until they are released.
+    """
+    def __init__(self, max_frames=256):
+        """
+        :param max_frames: the number of images kept on disk, pinned frames excluded
+        """
+        self.max_frames = max_frames
+        self.entries = OrderedDict()
+        self.pinned = set()
+        self.lock = Lock()
+        self.prefetcher = ThreadPoolExecutor(max_workers=1)
+        self.hits = 0
+        self.misses = 0
+
+    def __evict(self):
+        unpinned = len(self.entries) - len(self.pinned)
+        for key in list(self.entries.keys()):
+            if unpinned <= self.max_frames:
+                break
+            if key not in self.pinned:
+                del self.entries[key]
+                uncache_frame(frame_name(*key))
+                unpinned -= 1
+
+    def __insert(self, key, pin):
+        with self.lock:
+            self.entries[key] = True
+            self.entries.move_to_end(key)
+            if pin:
+                self.pinned.add(key)
+            self.__evict()
+
+    def get(self, vidname, frameno, pin=True):
+        """
+        Get the image of a frame, encoding it if not cached.
+        :param vidname: the name of the video
+        :param frameno: the number of the frame
+        :param pin: if True the image is not evicted until released
+        :return: the path of the image
+        """
+        key = (vidname, frameno)
+        with self.lock:
+            hit = key in self.entries
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            was_pinned = key in self.pinned
+            # pinned before encoding, so that a prefetch can not evict the image in the meantime
+            self.entries[key] = True
+            self.entries.move_to_end(key)
+            self.pinned.add(key)
+        try:
+            path = cache_frame(frame_name(vidname, frameno))
+        except Exception:
+            with self.lock:
+                if not was_pinned:
+                    self.pinned.discard(key)
+                if not hit:
+                    self.entries.pop(key, None)
+            raise
+        with self.lock:
+            if not pin and not was_pinned:
+                self.pinned.discard(key)
+            self.__evict()
+        return path
+
+    def release(self, vidname, frameno, discard=False):
+        """
+        Unpin the image of a frame.
+        :param discard: if True the image is deleted (ex: the frame has been labeled and will not be served again)
+        """
+        key = (vidname, frameno)
+        with self.lock:
+            self.pinned.discard(key)
+            if discard:
+                self.entries.pop(key, None)
+        if discard:
+            uncache_frame(frame_name(vidname, frameno))
+
+    def __prefetch(self, vidname, frameno):
+        key = (vidname, frameno)
+        with self.lock:
+            if key in self.entries:
+                return
+        try:
+            cache_frame(frame_name(vidname, frameno))
+        except Exception:
+            # prefetching is only a guess, the frame will be encoded on request
+            return
+        self.__insert(key, pin=False)
+
+    def prefetch(self, frames):
+        """
+        Encode the images of some frames in background.
+        :param frames: the (vidname, frameno) of the frames likely to be requested next
+        """
+        for vidname, frameno in frames:
+            self.prefetcher.submit(self.__prefetch, vidname, frameno)
+
+    def stats(self):
+        with self.lock:
+            return {'frames': len(self.entries), 'pinned': len(self.pinned), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,156 @@
+import heapq
+
+from data.datasets.framedata_management.index import FLAG_UNLABELED
+
+
+class UnlabeledRuns:
+    """
+    Segment tree over the frames of a video, keeping the longest run of unlabeled frames.
+    Changing the state of a frame is O(log frames), the selected frame is given in O(1)
+    and is the same best_frame_in_flags in utils.py would select from the index content.
+    """
+    def __init__(self, content):
+        """
+        :param content: the content of the index file of the video
+        """
+        self.length = len(content)
+        self.size = 1
+        while self.size < max(self.length, 1):
+            self.size *= 2
+        # for each node: unlabeled prefix length, unlabeled suffix length, longest run length and start,
+        # first frame and number of frames covered
+        self.pre = [0] * (2 * self.size)
+        self.suf = [0] * (2 * self.size)
+        self.best = [0] * (2 * self.size)
+        self.start = [0] * (2 * self.size)
+        self.lo = [0] * (2 * self.size)
+        self.span = [0] * (2 * self.size)
+        for i in range(self.size):
+            leaf = self.size + i
+            self.span[leaf] = 1
+            self.start[leaf] = self.lo[leaf] = i
+            if i < self.length and content[i] == FLAG_UNLABELED:
+                self.pre[leaf] = self.suf[leaf] = self.best[leaf] = 1
+        for node in range(self.size - 1, 0, -1):
+            self.span[node] = 2 * self.span[2 * node]
+            self.lo[node] = self.lo[2 * node]
+            self.__merge(node)
+
+    def __merge(self, node):
+        left, right = 2 * node, 2 * node + 1
+        half = self.span[left]
+        self.pre[node] = self.pre[left] if self.pre[left] < half else half + self.pre[right]
+        self.suf[node] = self.suf[right] if self.suf[right] < half else half + self.suf[left]
+        # on ties the leftmost run wins, as in the linear scan
+        best, start = self.best[left], self.start[left]
+        cross = self.suf[left] + self.pre[right]
+        if cross > best:
+            best, start = cross, self.lo[right] - self.suf[left]
+        if self.best[right] > best:
+            best, start = self.best[right], self.start[right]
+        self.best[node], self.start[node] = best, start
+
+    def set_unlabeled(self, frameno, unlabeled):
+        """
+        :param frameno: the frame whose state has changed
+        :param unlabeled: True if the frame is now waiting for labels
+        """
+        node = self.size + frameno
+        self.pre[node] = self.suf[node] = self.best[node] = 1 if unlabeled else 0
+        node //= 2
+        while node > 0:
+            self.__merge(node)
+            node //= 2
+
+    def is_unlabeled(self, frameno):
+        return self.best[self.size + frameno] == 1
+
+    def selection(self):
+        """
+        :return: the frame to be labeled next and the length of its unlabeled interval, (-1, -1) if none
+        """
+        # give precedence to first and last frame for interpolation
+        if self.length == 0:
+            return -1, -1
+        if self.is_unlabeled(0):
+            return 0, self.length
+        if self.is_unlabeled(self.length - 1):
+            return self.length - 1, self.length
+        if self.best[1] == 0:
+            return -1, -1
+        return self.start[1] + (self.best[1] - 1) // 2, self.best[1]
+
+
+class FrameSelector:
+    """
+    Priority structure over all the videos, giving the frame to be labeled next
+    (the one select_best_overall_frame in utils.py would give) in O(log frames + log videos).
+    It is not thread safe: the caller should select and mark the frame as
+    being processed under the same lock, so that two labelers never get the same frame.
+    """
+    def __init__(self, indexes):
+        """
+        :param indexes: a dictionary with the index file content of each video
+        """
+        self.runs = {}
+        self.versions = {}
+        self.heap = []
+        for vidname, content in indexes.items():
+            self.add_video(vidname, content)
+
+    def __push(self, vidname):
+        self.versions[vidname] += 1
+        _, interval = self.runs[vidname].selection()
+        heapq.heappush(self.heap, (-interval, vidname, self.versions[vidname]))
+        # stale entries are dropped lazily, rebuild when they are too many
+        if len(self.heap) > 4 * len(self.runs) + 64:
+            self.heap = [(-self.runs[v].selection()[1], v, self.versions[v]) for v in self.runs]
+            heapq.heapify(self.heap)
+
+    def add_video(self, vidname, content):
+        self.runs[vidname] = UnlabeledRuns(content)
+        self.versions[vidname] = self.versions.get(vidname, 0)
+        self.__push(vidname)
+
+    def set_flag(self, vidname, frameno, flag):
+        """
+        Update the structure after the flag of a frame has changed in the index
+        """
+        runs = self.runs[vidname]
+        unlabeled = flag == FLAG_UNLABELED
+        if runs.is_unlabeled(frameno) != unlabeled:
+            runs.set_unlabeled(frameno, unlabeled)
+            self.__push(vidname)
+
+    def select(self):
+        """
+        :return: the video and frame number of the frame to be labeled next, None if all are labeled
+        """
+        while self.heap:
+            priority, vidname, version = self.heap[0]
+            if self.versions.get(vidname) != version:
+                heapq.heappop(self.heap)
+                continue
+            if -priority <= 0:
+                return None
+            return vidname, self.runs[vidname].selection()[0]
+        return None
+
+    def peek(self, count):
+        """
+        The frames that would be selected next, if each one was marked as being processed in turn.
+        :param count: the number of frames
+        :return: the list of up to count (vidname, frameno) in selection order
+        """
+        selected = []
+        for _ in range(count):
+            frame = self.select()
+            if frame is None:
+                break
+            selected.append(frame)
+            self.runs[frame[0]].set_unlabeled(frame[1], False)
+            self.__push(frame[0])
+        for vidname, frameno in selected:
+            self.runs[vidname].set_unlabeled(frameno, True)
+            self.__push(vidname)
+        return selected
@@ -1,23 +1,58 @@
+from contextlib import contextmanager
+import fcntl
+import mmap
+
+import numpy as np
+
 from data.datasets.framedata_management.frame_caching import *
 
 FLAG_PROCESSING = '6'
 FLAG_LABELED = '0'
 FLAG_UNLABELED = '1'
 
+# Index files hold one byte flag per frame. They are changed in place through a memory map,
+# writing only the changed bytes, and locked so that concurrent requests do not race.
+
+
+@contextmanager
+def mapped_index(complete_filename, write=True):
+    """
+    Memory map an index file while holding its lock.
+    :param complete_filename: the path of the index file
+    :param write: if True the lock is exclusive and the map writable, otherwise the lock is shared
+    :return: a context manager giving the uint8 array of the flags, changes are written to the file
+    """
+    with open(complete_filename, "r+b" if write else "rb") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+        if os.fstat(f.fileno()).st_size == 0:
+            yield np.zeros(shape=(0,), dtype=np.uint8)
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if write else mmap.ACCESS_READ)
+        try:
+            yield np.frombuffer(mm, dtype=np.uint8)
+        finally:
+            # the map keeps a duplicate of the descriptor, the lock is released explicitly.
+            # If the caller still holds the array, the map is closed when the array is freed
+            fcntl.flock(f, fcntl.LOCK_UN)
+            try:
+                mm.close()
+            except BufferError:
+                pass
+
 
 def get_index_content(vidname):
-    index_complete_path = get_index_from_vidname(vidname)
-    index = open(index_complete_path, "r")
-    content = index.read()
-    index.close()
-    return content
+    with mapped_index(get_index_from_vidname(vidname), write=False) as flags:
+        return flags.tobytes().decode()
 
 
-def tick_index_counters(vidname):
-    index_path = get_index_from_vidname(vidname)
-    index = open(index_path, "r+")
-    content = index.read()
+def tick_flags(content):
+    """
+    Decrease the counters of the frames being processed by some labeler.
+    :param content: the content of an index file
+    :return: the updated content and the list of frames that went back to unlabeled
+    """
     updated_content = ''
+    released = []
     for frameno in range(len(content)):
         framecode = content[frameno]
         if framecode == FLAG_UNLABELED or framecode == FLAG_LABELED:
@@ -26,10 +61,26 @@ def tick_index_counters(vidname):
             newval = str(int(framecode) - 1)
             updated_content += newval
             if newval == FLAG_UNLABELED:
-                uncache_frame(frame_name(vidname, frameno))
-    index.seek(0)
-    index.write(updated_content)
-    index.close()
+                released.append(frameno)
+    return updated_content, released
+
+
+def tick_index_file(complete_filename):
+    """
+    Decrease in place the counters of the frames being processed, as tick_flags does.
+    Only the bytes of the frames being processed are written.
+    :param complete_filename: the path of the index file
+    :return: the list of frames that went back to unlabeled
+    """
+    with mapped_index(complete_filename) as flags:
+        processing = np.flatnonzero(flags > ord(FLAG_UNLABELED))
+        flags[processing] -= 1
+        return [int(frameno) for frameno in processing[flags[processing] == ord(FLAG_UNLABELED)]]
+
+
+def tick_index_counters(vidname):
+    for frameno in tick_index_file(get_index_from_vidname(vidname)):
+        uncache_frame(frame_name(vidname, frameno))
 
 
 def build_empty_index_file(complete_filename, index_len):
@@ -38,8 +89,21 @@ def build_empty_index_file(complete_filename, index_len):
     f.close()
 
 
+def set_index_flags(complete_filename, flags):
+    """
+    Change the flags of many frames of an index at once, in place.
+    :param complete_filename: the path of the index file
+    :param flags: a dictionary with the new flag of each frame number
+    """
+    with mapped_index(complete_filename) as index:
+        for idx, flag in flags.items():
+            index[idx] = ord(flag)
+
+
 def set_index_flag(complete_filename, flag, idx):
-    f = open(complete_filename, "r+")
-    f.seek(idx)
-    f.write(flag)
-    f.close()
+    set_index_flags(complete_filename, {idx: flag})
+
+
+def get_index_flag(complete_filename, idx):
+    with mapped_index(complete_filename, write=False) as index:
+        return chr(index[idx])
@@ -0,0 +1,146 @@
+import fcntl
+import time
+
+import numpy as np
+
+from data.datasets.framedata_management.naming import *
+from data.datasets.io.hand_io import load, store, ALL_DATA
+
+# Labels of a video are appended to its journal file as fixed size records, instead of
+# rewriting the whole frame .mat file (image included) for every label.
+# Readers merge the journal over the labels of the frame files, where the journal is
+# periodically compacted. The latest record of a frame wins.
+RECORD_SET = 1
+RECORD_DELETE = 0
+CONTRIBUTOR_BYTES = 16
+JOURNAL_RECORD = np.dtype([('frameno', '<u4'),
+                           ('kind', 'u1'),
+                           ('timestamp', '<f8'),
+                           ('contributor', 'S%d' % CONTRIBUTOR_BYTES),
+                           ('labels', '<f8', (21, 3))])
+# suffix of a journal while being compacted, new records go to a new journal meanwhile
+COMPACTING = ".compacting"
+
+
+def __open_locked(path, mode):
+    """
+    Open a file and lock it exclusively, making sure that it has not been renamed
+    by a compaction while waiting for the lock
+    """
+    while True:
+        f = open(path, mode)
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+        f.close()
+
+
+def append_labels(vidname, frameno, labels, contributor=None, timestamp=None):
+    """
+    Append the new labels of a frame to the journal of its video, a single small write.
+    :param vidname: the name of the video
+    :param frameno: the number of the frame
+    :param labels: the 21 (x, y, visible) labels of the frame, None to delete its labels
+    :param contributor: the optional nick of the contributor, truncated to CONTRIBUTOR_BYTES bytes
+    :param timestamp: the time of the labeling, now if not given
+    """
+    record = np.zeros(shape=(), dtype=JOURNAL_RECORD)
+    record['frameno'] = frameno
+    record['kind'] = RECORD_DELETE if labels is None else RECORD_SET
+    record['timestamp'] = time.time() if timestamp is None else timestamp
+    record['contributor'] = (contributor or '').encode()[:CONTRIBUTOR_BYTES]
+    if labels is not None:
+        record['labels'] = labels
+    with __open_locked(get_journal_from_vidname(vidname), "ab") as f:
+        f.write(record.tobytes())
+
+
+def __read_records(path):
+    if not os.path.exists(path):
+        return np.zeros(shape=(0,), dtype=JOURNAL_RECORD)
+    with open(path, "rb") as f:
+        content = f.read()
+    # a partial record at the end is an interrupted write, ignored
+    complete = len(content) // JOURNAL_RECORD.itemsize * JOURNAL_RECORD.itemsize
+    return np.frombuffer(content[:complete], dtype=JOURNAL_RECORD)
+
+
+def read_journal_records(vidname):
+    """
+    :param vidname: the name of the video
+    :return: the structured array of all the JOURNAL_RECORD of the video not compacted yet, oldest first
+    """
+    journal = get_journal_from_vidname(vidname)
+    # read before the journal being compacted, so that a compaction starting meanwhile
+    # gives the same records twice rather than none
+    records = __read_records(journal)
+    # the records being compacted go first, as they are older
+    return np.concatenate((__read_records(journal + COMPACTING), records))
+
+
+def latest_labels(records):
+    """
+    :param records: an array of JOURNAL_RECORD, oldest first
+    :return: a dictionary with the latest labels of each frame, None for deleted labels
+    """
+    latest = {}
+    for record in records:
+        latest[int(record['frameno'])] = record['labels'].copy() if record['kind'] == RECORD_SET else None
+    return latest
+
+
+def read_journal(vidname):
+    """
+    :param vidname: the name of the video
+    :return: a dictionary with the labels of the frames changed since the last compaction, None for deleted labels
+    """
+    return latest_labels(read_journal_records(vidname))
+
+
+def merge_labels(base_labels, journal, frameno):
+    """
+    :param base_labels: the labels of the frame file, None if not present
+    :param journal: the dictionary given by read_journal
+    :param frameno: the number of the frame
+    :return: the current labels of the frame
+    """
+    if frameno in journal:
+        return journal[frameno]
+    return base_labels
+
+
+def compact_journal(vidname):
+    """
+    Write the labels of the journal of a video into its frame files and empty the journal.
+    Labels can be appended and read during the compaction.
+    :param vidname: the name of the video
+    :return: the number of frame files rewritten, None if another compaction of the video is running
+    """
+    journal = get_journal_from_vidname(vidname)
+    compacting = journal + COMPACTING
+    with open(journal + ".lock", "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        # the journal being compacted is already there if a previous compaction was interrupted
+        if not os.path.exists(compacting):
+            if not os.path.exists(journal):
+                return 0
+            os.rename(journal, compacting)
+        # wait for the appends still writing to the renamed journal
+        with __open_locked(compacting, "ab"):
+            pass
+        latest = latest_labels(__read_records(compacting))
+        for frameno, labels in latest.items():
+            framefile = get_complete_frame_path(frame_name(vidname, frameno))
+            if not os.path.exists(framefile):
+                continue
+            rgb, _, depth = load(framefile, format=ALL_DATA)
+            # the frame may be read meanwhile (ex: by the labeling server)
+            store(framefile, data=rgb, labels=labels, depth=depth, atomic=True)
+        os.remove(compacting)
+        return len(latest)
@@ -0,0 +1,212 @@
+import json
+import socket
+import socketserver
+from threading import Lock, Thread
+
+from data.datasets.framedata_management.utils import *
+from data.datasets.framedata_management.frame_selection import FrameSelector
+from data.datasets.framedata_management.frame_caching import FrameImageCache
+from data.datasets.framedata_management.contributor_store import ContributorStore, ranking_lines
+
+# maximum size of a request line, labels are about 1KB
+MAX_REQUEST_SIZE = 1 << 16
+# labels appended to the journal of a video before compacting it into the frame files
+COMPACTION_RECORDS = 256
+# frame images kept encoded, and frames encoded in advance at each request
+CACHED_FRAMES = 256
+PREFETCH_FRAMES = 4
+
+
+class LabelingError(Exception):
+    pass
+
+
+class LabelingService:
+    """
+    The operations of the labeling site, run in a single long living process.
+    Index files are read once and kept in memory, every change is still written
+    through to the files so that they can be read by the offline tools (ex: completion.py) at any time.
+    Contributors are counted in a ContributorStore.
+    The next frame to be labeled is kept in a FrameSelector, updated at every index change.
+    Labels are appended to the label journal of the video, compacted in background every COMPACTION_RECORDS labels.
+    Frame images are kept in a FrameImageCache, where the next PREFETCH_FRAMES frames
+    the selector would give are encoded in advance.
+    Index operations are serialized by a lock, so concurrent labelers
+    never receive the same frame, while frame files are read and written outside of it.
+    Tools that change the frame directories while the service is running
+    (ex: build_frames.py, clean_frames.py) should be followed by a reload.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.indexes = {}
+        self.selector = FrameSelector({})
+        self.contributors = ContributorStore()
+        self.journal_records = {}
+        self.images = FrameImageCache(max_frames=CACHED_FRAMES)
+        self.reload()
+
+    def reload(self):
+        """
+        Read again all the index files
+        """
+        with self.lock:
+            self.indexes = {vidname: get_index_content(vidname) for vidname in list_videos()
+                            if os.path.isfile(get_index_from_vidname(vidname))}
+            self.selector = FrameSelector(self.indexes)
+        return []
+
+    def __set_flag(self, vidname, frameno, flag):
+        content = self.indexes[vidname]
+        self.indexes[vidname] = content[:frameno] + flag + content[frameno + 1:]
+        set_index_flag(get_index_from_vidname(vidname), flag=flag, idx=frameno)
+        self.selector.set_flag(vidname, frameno, flag)
+
+    def __index(self, frame):
+        vidname = get_vidname(frame)
+        if vidname not in self.indexes:
+            raise LabelingError("Unknown video %s" % vidname)
+        return vidname, self.indexes[vidname]
+
+    def get_frame(self):
+        """
+        Select the next frame to be labeled and mark it as being processed.
+        :return: the url of the cached image of the frame
+        """
+        with self.lock:
+            selected = self.selector.select()
+            if selected is None:
+                raise LabelingError("No frame left to be labeled")
+            vidname, frameno = selected
+            self.__set_flag(vidname, frameno, FLAG_PROCESSING)
+            following = self.selector.peek(PREFETCH_FRAMES)
+        try:
+            self.images.get(vidname, frameno)
+        except Exception:
+            # the frame can not be served (ex: missing or unreadable file), do not keep it reserved
+            with self.lock:
+                self.__set_flag(vidname, frameno, FLAG_UNLABELED)
+            raise
+        self.images.prefetch(following)
+        return [os.path.join(SERVER_SYMLINK, vidname, TEMPDIR, cached_frame_name(vidname, frameno))]
+
+    def get_index_content(self, frame):
+        with self.lock:
+            return [self.__index(frame)[1]]
+
+    def uncache_frame(self, frame):
+        """
+        Release a frame that has been given to a labeler who left without labeling it
+        """
+        frameno = get_frameno(frame)
+        with self.lock:
+            vidname, content = self.__index(frame)
+            labeled = content[frameno] == FLAG_LABELED
+            if not labeled:
+                self.__set_flag(vidname, frameno, FLAG_UNLABELED)
+        # the image is kept for the next labeler
+        self.images.release(vidname, frameno, discard=labeled)
+        return []
+
+    def register_labels(self, labelstring, frame, contributor=None):
+        """
+        Store the labels of a frame, as register_labels in utils.py
+        :return: an error line if the label number is incorrect
+        """
+        raw_labels = parse_labels(labelstring)
+        if raw_labels is None:
+            return ["Error: label number is incorrect"]
+        vidname, _ = self.__index(frame)
+        frameno = get_frameno(frame)
+        nick = (contributor or "").replace(" ", "") or "Anonymous"
+        store_labels(labels=raw_labels, frame=frame, contributor=nick)
+        self.contributors.increment(nick)
+        with self.lock:
+            self.journal_records[vidname] = self.journal_records.get(vidname, 0) + 1
+            compact = self.journal_records[vidname] >= COMPACTION_RECORDS
+            if compact:
+                self.journal_records[vidname] = 0
+            self.__set_flag(vidname, frameno, FLAG_LABELED)
+            self.indexes[vidname], released = tick_flags(self.indexes[vidname])
+            tick_index_file(get_index_from_vidname(vidname))
+            for released_frameno in released:
+                self.selector.set_flag(vidname, released_frameno, FLAG_UNLABELED)
+        self.images.release(vidname, frameno, discard=True)
+        for released_frameno in released:
+            self.images.release(vidname, released_frameno)
+        if compact:
+            Thread(target=compact_journal, args=(vidname,), daemon=True).start()
+        return []
+
+    def contributors_ranking(self, rank_width=16):
+        rank_width = int(rank_width)
+        return ranking_lines(self.contributors.leaderboard(rank_width), rank_width=rank_width)
+
+    def call(self, op, args):
+        """
+        Run an operation by name
+        :param op: one of the operation names of the php called scripts
+        :param args: the list of string arguments of the operation
+        :return: the list of output lines
+        """
+        operations = {'get_frame': self.get_frame,
+                      'get_index_content': self.get_index_content,
+                      'uncache_frame': self.uncache_frame,
+                      'register_labels': self.register_labels,
+                      'contributors': self.contributors_ranking,
+                      'reload': self.reload}
+        if op not in operations:
+            raise LabelingError("Unknown operation %s" % op)
+        return operations[op](*args)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST_SIZE)
+        try:
+            request = json.loads(line.decode())
+            response = {'ok': True, 'out': self.server.service.call(request['op'], request.get('args', []))}
+        except Exception as e:
+            response = {'ok': False, 'out': ["%s: %s" % (type(e).__name__, str(e))]}
+        self.wfile.write((json.dumps(response) + '\n').encode())
+
+
+class LabelingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serve a LabelingService on a unix socket, one json line per request and per response:
+        request: {"op": name, "args": [string arguments]}
+        response: {"ok": true if the operation succeeded, "out": [output lines]}
+    Output lines are the same the php called scripts print.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=labeling_socket, service=None):
+        self.service = service or LabelingService()
+        if os.path.exists(address):
+            os.remove(address)
+        super().__init__(address, _RequestHandler)
+        # the web server user must be able to connect
+        os.chmod(address, 0o666)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def request(op, args=(), address=labeling_socket, timeout=10.0):
+    """
+    Call an operation of a running LabelingServer.
+    :param op: the name of the operation
+    :param args: the string arguments of the operation
+    :param address: the unix socket of the server
+    :param timeout: seconds before giving up
+    :return: the list of output lines
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(address)
+        s.sendall((json.dumps({'op': op, 'args': list(args)}) + '\n').encode())
+        response = json.loads(s.makefile('rb').readline().decode())
+    if not response['ok']:
+        raise LabelingError("\n".join(response['out']))
+    return response['out']
@@ -4,6 +4,11 @@ import os
 
 framebase = resources_path("framedata")
 contributors = os.path.join(framebase, "contributors.txt")
+contributors_db = os.path.join(framebase, "contributors.db")
+# unix socket of the labeling server, see labeling_server.py
+labeling_socket = os.path.join(framebase, "labeling.sock")
+# path of framebase as seen from the labeling site
+SERVER_SYMLINK = "/framedata"
 TEMPDIR = "tmp"
 NUMDIGITS = 4
 NUMREPR = "%0"+str(NUMDIGITS)+"d"
@@ -18,6 +23,10 @@ def index_name(vidname):
     return "%s-index.txt" % (vidname,)
 
 
+def journal_name(vidname):
+    return "%s-labels.journal" % (vidname,)
+
+
 def cached_frame_name(vidname, frameno):
     return (FRAME_NAME_BASE+".png") % (vidname, frameno)
 
@@ -35,6 +44,10 @@ def get_index_from_vidname(vidname):
     return os.path.join(viddir, index_name(vidname))
 
 
+def get_journal_from_vidname(vidname):
+    return os.path.join(framebase, vidname, journal_name(vidname))
+
+
 def get_index_from_frame(framename):
     return get_index_from_vidname(get_vidname(framename))
 
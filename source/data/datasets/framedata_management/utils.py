@@ -4,6 +4,8 @@ from tqdm import tqdm
 from data.datasets.framedata_management.index import *
 from data.datasets.io.hand_io import *
 from data.datasets.framedata_management.frame_caching import *
+from data.datasets.framedata_management.label_journal import append_labels, compact_journal
+from data.datasets.framedata_management.contributor_store import ContributorStore
 from data.datasets.framedata_management.camera_data_conversion import read_frame_data, \
     default_read_z16_args, \
     default_read_rgb_args
@@ -63,23 +65,29 @@ def build_frame_root_from_arrays(videoname, imgdata, depthdata=None, post_proces
     return True
 
 
-def save_labels(labels, frame):
+def store_labels(labels, frame, contributor=None):
+    append_labels(get_vidname(frame), get_frameno(frame), labels, contributor=contributor)
+
+
+def save_labels(labels, frame, contributor=None):
     vidn = get_vidname(frame)
     framedir = os.path.join(framebase, vidn)
-    frame = get_complete_frame_path(frame_name(vidn, get_frameno(frame)))
-    img, _, depth = load(frame, format=ALL_DATA)
-    store(frame, data=img, labels=labels, depth=depth)
+    store_labels(labels, frame, contributor=contributor)
     set_index_flag(os.path.join(framedir, index_name(vidn)),
                    flag=FLAG_LABELED,
                    idx=get_frameno(frame))
 
 
 def select_best_frame(vidname):
-    viddir = os.path.join(framebase, vidname)
-    index = open(os.path.join(viddir, index_name(vidname)), "r")
-    flagset = index.read()
-    index.close()
+    return best_frame_in_flags(get_index_content(vidname))
+
 
+def best_frame_in_flags(flagset):
+    """
+    Select the frame of a video that should be labeled next.
+    :param flagset: the content of the index file of the video
+    :return: the selected frame number and the length of its unlabeled interval, (-1, -1) if none
+    """
     # give precedence to first and last frame for interpolation
     if flagset[0] == FLAG_UNLABELED:
         return 0, len(flagset)
@@ -108,13 +116,16 @@ def select_best_frame(vidname):
     return (best_end + best_start) // 2, best_end - best_start + 1
 
 
-def select_best_overall_frame():
+def list_videos():
     vids = os.listdir(framebase)
-    bestvid = ('', -1, -1)
     vids = [os.path.join(framebase, vid) for vid in vids]
     vids = [vid_dir for vid_dir in vids if os.path.isdir(vid_dir)]
-    vids = [vid.split('/')[-1] for vid in vids]
-    for vidname in vids:
+    return [vid.split('/')[-1] for vid in vids]
+
+
+def select_best_overall_frame():
+    bestvid = ('', -1, -1)
+    for vidname in list_videos():
         selected_frame, frames_interval = select_best_frame(vidname)
         if frames_interval > bestvid[2]:
             bestvid = (vidname, selected_frame, frames_interval)
@@ -130,35 +141,35 @@ def select_best_overall_frame():
 
 
 def add_contributor(nick):
-    contribs = open(contributors, "r+")
-    c = contribs.readline()
-    pos = len(c)
-    while c != '' and c.split(' ')[0] != nick:
-        c = contribs.readline()
-        pos += len(c)
+    store = ContributorStore()
+    store.increment(nick)
+    store.close()
 
-    if c == '':
-        contribs.write(nick + " 0001\n")
-    else:
-        current_amount = int(c.split(' ')[1])
-        contribs.seek(pos - len(c))
-        contribs.write(nick + " %04d" % (current_amount + 1,))
 
-
-def register_labels(labelstring, frame, contributor=None):
+def parse_labels(labelstring):
+    """
+    Parse the labels sent by the labeling site.
+    :param labelstring: the comma separated x, y, visibility of the 21 joints
+    :return: the list of the 21 (x, y, visible) labels, None if the label number is incorrect
+    """
     tokens = labelstring.split(',')
     if len(tokens) != 63:
-        return False
+        return None
     raw_labels = []
     for idx in range(21):
         raw_labels.append((float(tokens[3*idx]),
                            float(tokens[3*idx+1]),
                            1 if tokens[3*idx+2] in ('true', 'True', 'TRUE') else 0))
-    save_labels(labels=raw_labels, frame=frame)
-    if contributor is not None:
-        add_contributor(contributor.replace(" ", ""))
-    else:
-        add_contributor("Anonymous")
+    return raw_labels
+
+
+def register_labels(labelstring, frame, contributor=None):
+    raw_labels = parse_labels(labelstring)
+    if raw_labels is None:
+        return False
+    nick = contributor.replace(" ", "") if contributor is not None else "Anonymous"
+    save_labels(labels=raw_labels, frame=frame, contributor=nick)
+    add_contributor(nick)
     uncache_frame(frame)
     tick_index_counters(get_vidname(frame))
     return True
@@ -169,10 +180,10 @@ def rewrite_labels(vidname, frameno, newlabels=None):
     if not os.path.exists(framefile):
         return False
     index = get_index_from_vidname(vidname)
-    rgb, depth, labels = hio.load(framefile, format=(RGB_DATA, DEPTH_DATA, LABEL_DATA))
-    if labels is None and newlabels is not None:
+    labeled = get_index_flag(index, idx=frameno) == FLAG_LABELED
+    if not labeled and newlabels is not None:
         set_index_flag(index, flag=FLAG_LABELED, idx=frameno)
-    if labels is not None and newlabels is None:
+    if labeled and newlabels is None:
         set_index_flag(index, flag=FLAG_UNLABELED, idx=frameno)
-    hio.store(framefile, data=rgb, depth=depth, labels=newlabels)
+    append_labels(vidname, frameno, newlabels)
     return True
@@ -1,5 +1,6 @@
 from data.datasets.framedata_management.naming import *
 from data.datasets.io.hand_io import *
+from data.datasets.framedata_management.label_journal import read_journal, merge_labels
 import numpy as np
 import os
 
@@ -8,12 +9,34 @@ LABELED = 1
 UNLABELED = 0
 
 
-def load_labeled_video(vidname, getdepth=False, fillgaps=True, gapflags=False):
+class LazyVideoFrames:
+    """
+    Read-only sequence of the frames of a video, each one read from its file when indexed.
+    """
+    def __init__(self, frame_files, tag=RGB_DATA):
+        """
+        :param frame_files: the paths of the frame files, in order
+        :param tag: the data to read from the frame files, RGB_DATA or DEPTH_DATA
+        """
+        self.frame_files = frame_files
+        self.tag = tag
+
+    def __len__(self):
+        return len(self.frame_files)
+
+    def __getitem__(self, idx):
+        return load(self.frame_files[idx], format=(self.tag,))[0]
+
+
+def load_labeled_video(vidname, getdepth=False, fillgaps=True, gapflags=False, lazy=False):
     """
     Load all frames of a video in a 4-dimentional numpy array, with all available labels.
     Missing labels are written linearly interpolating the available data.
+    Labels not compacted in the frame files yet are taken from the label journal.
     Usage example: frames, labels = load_labeled_video("snap")
     :param vidname: a string with the name of the video
+    :param lazy: if True, only labels are loaded and frames are a LazyVideoFrames sequence,
+                 reading each frame when indexed
     :return: a tuple with all frames and labels in the format (frames, labels)
     """
     dirpath = os.path.join(framebase, vidname)
@@ -21,18 +44,25 @@ def load_labeled_video(vidname, getdepth=False, fillgaps=True, gapflags=False):
               for fname in os.listdir(dirpath)
               if fname.split(".")[-1] == 'mat']
     frames.sort(key=get_frameno)
+    journal = read_journal(vidname)
     frame_data = []
     label_data = []
     gap_list = []
     for frame in frames:
-        if getdepth:
+        if lazy:
+            fdata, ldata = None, load(frame, format=(LABEL_DATA,))[0]
+        elif getdepth:
             fdata, ldata = load(frame, format=(DEPTH_DATA, LABEL_DATA))
         else:
             fdata, ldata = load(frame)
+        ldata = merge_labels(ldata, journal, get_frameno(frame))
         frame_data.append(fdata)
         label_data.append(ldata)
         gap_list.append(UNLABELED if ldata is None else LABELED)
-    frame_data = np.array(frame_data)
+    if lazy:
+        frame_data = LazyVideoFrames(frames, tag=DEPTH_DATA if getdepth else RGB_DATA)
+    else:
+        frame_data = np.array(frame_data)
     label_data = np.array(label_data)
     gap_list = np.array(gap_list)
     if fillgaps:
@@ -1,3 +1,6 @@
+import os
+from threading import get_ident
+
 from data.naming import *
 import scipy.io as scio
 
@@ -17,7 +20,8 @@ def load(respath, format=(RGB_DATA, LABEL_DATA)):
     :return: a tuple of numpy arrays in the order specified by param format,
             fields are None if not present
     """
-    matdict = scio.loadmat(resources_path(respath))
+    # only the requested variables are read (ex: labels without the image)
+    matdict = scio.loadmat(resources_path(respath), variable_names=list(format))
 
     def retrieve_content(tag):
         if tag in matdict.keys():
@@ -30,13 +34,15 @@ def load(respath, format=(RGB_DATA, LABEL_DATA)):
     return tuple(ret)
 
 
-def store(respath, data=None, labels=None, depth=None):
+def store(respath, data=None, labels=None, depth=None, atomic=False):
     """
     Store data on a .mat file implementing all HandTracking naming conventions
     :param respath: the path of the .mat file taken from the resources base directory
     :param data: the optional frame data to be stored as a numpy matrix
     :param labels: the optional labels to be associated with the frame
     :param depth: the optional depth map to be associated with the frame
+    :param atomic: if True, the file is written aside and then renamed over the old one,
+                   so that concurrent readers never see it partially written
     """
     outdict = {}
     if data is not None:
@@ -49,4 +55,15 @@ def store(respath, data=None, labels=None, depth=None):
         return
 
     respath = resources_path(respath)
-    scio.savemat(respath, outdict)
+    if not atomic:
+        scio.savemat(respath, outdict)
+        return
+    # not ending with .mat, so that frame listings ignore it
+    partial = respath + ".%d.%d.part" % (os.getpid(), get_ident())
+    try:
+        with open(partial, "wb") as f:
+            scio.savemat(f, outdict)
+        os.replace(partial, respath)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
@@ -10,3 +10,17 @@ def heatmaps_to_hand(joints: np.ndarray, visibility: np.ndarray):
         coords.append([peak[0]/heatshape[0], peak[1]/heatshape[1], visibility[idx]])
     return hand_format(coords)
 
+
+def heatmaps_to_hands(joints: np.ndarray, visibility: np.ndarray):
+    """
+    Batch version of heatmaps_to_hand.
+    :param joints: a (N, H, W, 21) batch of joint heatmaps
+    :param visibility: the (N, 21) visibility of the joints
+    :return: the (N, 21, 3) raw hands, as (row, column) relative to the heatmap size and visibility
+    """
+    count, height, width = np.shape(joints)[:3]
+    visibility = np.reshape(visibility, (count, -1))
+    jointcount = visibility.shape[1]
+    heats = np.reshape(np.asarray(joints)[..., :jointcount], (count, height * width, jointcount))
+    rows, cols = np.unravel_index(np.argmax(heats, axis=1), (height, width))
+    return np.stack([rows / height, cols / width, visibility], axis=2)
@@ -99,6 +99,65 @@ def image2cameramodeldirectin(imagepoint, calibration):
     return sample
 
 
+def unproject(image_points, depths=None, calibration=None):
+    """
+    Vectorized mapping of image points into the camera space, as ImagePoint.to_camera_model
+    but on whole arrays of points (ex: a hand, or all the hands of a video).
+    :param image_points: a (..., 2) array of pixel coordinates
+    :param depths: the optional (...) array of depths in sensor units. Where the depth is 0 or NaN
+                   (or if no depths are given) the versor of the line of the point is returned
+    :param calibration: the calibration dictionary to consider
+    :return: a (..., 3) array of camera space points
+    """
+    if calibration is None:
+        calibration = current_calibration
+    intr = calibration[INTRINSIC]
+    image_points = np.asarray(image_points, dtype=np.float64)
+    y = (image_points[..., 1] - intr[CENTER_Y]) / intr[FOCAL_Y]
+    x = (image_points[..., 0] - intr[CENTER_X] - intr[SKEW] * y) / intr[FOCAL_X]
+    rays = np.stack((x, y, np.ones_like(x)), axis=-1)
+    if depths is None:
+        return rays / np.linalg.norm(rays, axis=-1, keepdims=True)
+    depths = np.broadcast_to(np.asarray(depths, dtype=np.float64), shape=x.shape)
+    measured = depths > 0
+    scale = np.where(measured, depths / calibration[DEPTHSCALE], 1 / np.linalg.norm(rays, axis=-1))
+    return rays * scale[..., None]
+
+
+def project(model_points, calibration=None, makedepth=False):
+    """
+    Vectorized mapping of model points into the image, as ModelPoint.to_image_space
+    but on whole arrays of points.
+    :param model_points: a (..., 3) array of model points
+    :param calibration: the calibration dictionary to consider
+    :param makedepth: if True, also the depths of the points in sensor units are returned
+    :return: the (..., 2) array of pixel coordinates, points on the camera plane are mapped to zero.
+             If makedepth, a tuple (pixel coordinates, (...) depths)
+    """
+    if calibration is None:
+        calibration = current_calibration
+    model_points = np.asarray(model_points, dtype=np.float64)
+    ext = np.asarray(calibration[EXTRINSIC], dtype=np.float64)
+    camera_points = model_points @ ext[0:3] + ext[3]
+    image_points = camera_points @ intrinsic_matrix(calibration[INTRINSIC])
+    z = image_points[..., 2:3]
+    image_points = np.divide(image_points[..., 0:2], z, out=np.zeros_like(image_points[..., 0:2]), where=z != 0)
+    if not makedepth:
+        return image_points
+    return image_points, calibration[DEPTHSCALE] * camera_points[..., 2]
+
+
+def image_points_arrays(image_points):
+    """
+    Convert a sequence of ImagePoint into arrays for project and unproject
+    :param image_points: the sequence of ImagePoint
+    :return: a tuple of a (N, 2) array of coordinates and a (N,) array of depths, 0 where not visible
+    """
+    coords = np.array([p.coords[0:2] for p in image_points], dtype=np.float64).reshape(-1, 2)
+    depths = np.array([p.depth if p.visible else 0 for p in image_points], dtype=np.float64)
+    return coords, depths
+
+
 def synth_intrinsic(resolution, fov):
     """
     Synthesize an intrinsic dictionary configuration based on desired resolution and field of view.
@@ -0,0 +1,70 @@
+from concurrent.futures import ProcessPoolExecutor
+from library.geometry.hand_localization.hand_localization_num import compute_hand_world_joints_from_info
+from library.geometry.hand_localization.depth_suggestion import extract_model_info_batch, model_info_format
+from library.geometry.hand_localization.parameters import *
+from library.geometry.calibration import current_calibration
+from library.geometry.numerical.palm_threepts_inference import PalmSolver
+from library.utils.logging import log, WARNINGS
+
+# state of the worker processes, set once at their start so that the
+# hand model is not shipped again with every frame
+_worker_hand_model = None
+_worker_palm_solver = None
+
+
+def _init_worker(base_hand_model):
+    global _worker_hand_model
+    global _worker_palm_solver
+    _worker_hand_model = base_hand_model
+    # frames are not guaranteed to be consecutive in a worker: no warm start,
+    # but results do not depend on how frames are distributed
+    _worker_palm_solver = PalmSolver(warm_start=False)
+
+
+def _solve_frame(task):
+    """
+    Reconstruct a single hand from its array model info.
+    :param task: a tuple (lines, points, side) of (21, 3), (21, 3) arrays and RIGHT or LEFT
+    :return: the (21, 3) world joints, NaN if the reconstruction failed
+    """
+    lines, points, side = task
+    lines_info, depth_info = model_info_format(lines, points)
+    try:
+        model = compute_hand_world_joints_from_info(_worker_hand_model, lines_info, depth_info, side=int(side),
+                                                    palm_solver=_worker_palm_solver)
+        return raw(model)
+    except Exception as e:
+        log("Hand reconstruction failed: %s" % str(e), level=WARNINGS)
+        return np.full(shape=(21, 3), fill_value=np.nan)
+
+
+def compute_hand_world_joints_batch(base_hand_model, image_joints, depths=None, side=RIGHT, cal=None,
+                                    processes=None, chunksize=8):
+    """
+    Compute the hand model in the space for many frames at once (ex: a whole labelled video).
+    Image to camera mapping is vectorized over all frames, while frames are reconstructed
+    in parallel by a pool of processes that receive the hand model only once.
+    :param base_hand_model: the standard hand prototype to use for interpolation
+    :param image_joints: a (N, 21, 2) array of image joint coordinates
+    :param depths: the optional (N, 21) array of measured joint depths in sensor units, 0 where not available
+    :param side: one of RIGHT or LEFT for all the hands, or a (N,) array of sides
+    :param cal: the calibration of the image joints to use
+    :param processes: the number of worker processes. None uses all cores, 0 runs in the calling process
+    :param chunksize: the number of frames sent to a worker at once
+    :return: a (N, 21, 3) array of world joints. Frames that could not be reconstructed are NaN
+    """
+    if cal is None:
+        cal = current_calibration
+    lines, points = extract_model_info_batch(image_joints, depths, cal)
+    sides = np.broadcast_to(side, shape=(len(lines),))
+    tasks = zip(lines, points, sides)
+
+    if processes == 0:
+        _init_worker(base_hand_model)
+        return np.array([_solve_frame(task) for task in tasks]).reshape(-1, 21, 3)
+
+    with ProcessPoolExecutor(max_workers=processes,
+                             initializer=_init_worker,
+                             initargs=(base_hand_model,)) as pool:
+        results = list(pool.map(_solve_frame, tasks, chunksize=chunksize))
+    return np.array(results).reshape(-1, 21, 3)
@@ -13,17 +13,9 @@ def extract_model_info(image_joints, cal):
             containing the model line versors and depth-complete points.
             If a point is not visible, its joint will be None.
     """
-    if cal is None:
-        cal = current_calibration
-    vect_img_joints = raw(image_joints)
-    depth_suggestion = hand_format([joint.to_camera_model(calibration=cal).as_row()
-                                    if joint.visible and joint.depth > 0 else None
-                                    for joint in vect_img_joints])
-    line_suggestion = hand_format([normalize(joint.to_camera_model(calibration=cal).as_row())
-                                   if joint.visible and joint.depth > 0 else
-                                   joint.to_camera_model(calibration=cal).as_row()
-                                   for joint in vect_img_joints])
-    return line_suggestion, depth_suggestion
+    coords, depths = image_points_arrays(raw(image_joints))
+    lines, points = extract_model_info_batch(coords, depths, cal)
+    return model_info_format(lines, points)
 
 
 def depth_info_compare(measured, inferred, threshold, smooth=True):
@@ -48,3 +40,116 @@ def depth_info_compare(measured, inferred, threshold, smooth=True):
         return inferred
     return measured
 
+
+def measured_points(points):
+    """
+    :param points: a sequence of depth-measured points, None where not available
+    :return: the (N, 3) array of the points, NaN where not available
+    """
+    return np.array([np.full(shape=(3,), fill_value=np.nan) if p is None else p for p in points],
+                    dtype=np.float64).reshape((-1, 3))
+
+
+def depth_info_compare_batch(measured, inferred, threshold, smooth=True):
+    """
+    Vectorized depth_info_compare over many points at once (ex: all the joints of many hypotheses)
+    :param measured: a (..., 3) array of measured points, NaN where not available
+    :param inferred: a (..., 3) array of model-inferred points
+    :param threshold: the maximum allowed distances between the two, a scalar or a (...) array
+    :param smooth: decide whether to use a smooth interpolation or a crisp choice
+    :return: the (..., 3) array of chosen model points
+    """
+    measured = np.asarray(measured, dtype=np.float64)
+    inferred = np.asarray(inferred, dtype=np.float64)
+    threshold = np.asarray(threshold, dtype=np.float64)
+    dist = norm(inferred - measured, axis=-1)
+    if smooth:
+        rate = np.minimum(threshold, dist) / threshold
+    else:
+        rate = (dist > threshold).astype(np.float64)
+    # missing measures give NaN distances: keep the inferred point
+    rate = np.where(np.isnan(dist), 1., rate)[..., None]
+    return inferred * rate + np.nan_to_num(measured) * (1 - rate)
+
+
+def score_depth_hypotheses(hypotheses, measured, threshold):
+    """
+    Score many hypotheses of the same points against their depth measures, all at once.
+    Each measured point contributes its distance from the hypothesis, saturated at threshold,
+    so that wrong measures do not dominate the score.
+    :param hypotheses: a (K, ..., 3) array of K hypotheses (ex: (K, 21, 3) candidate hands)
+    :param measured: the (..., 3) array of measured points, NaN where not available
+    :param threshold: the distance over which a measure is considered in disagreement
+    :return: a (K,) array of scores in [0, 1], the lower the better. 0 if no measure is available
+    """
+    hypotheses = np.asarray(hypotheses, dtype=np.float64)
+    measured = np.asarray(measured, dtype=np.float64)
+    available = ~np.isnan(measured[..., 0])
+    if not np.any(available):
+        return np.zeros(shape=(len(hypotheses),))
+    dist = norm(hypotheses[:, available] - measured[available], axis=-1)
+    return np.mean(np.minimum(dist, threshold), axis=-1) / threshold
+
+
+def sample_depths(depth_map, image_points, radius=0):
+    """
+    Sample a depth map (ex: a Z16 frame) at many image points in one operation.
+    With a positive radius, the depth of each point is the median of the valid (non zero) depths
+    in the surrounding window, which is robust to holes and to the flying pixels at the hand edges.
+    :param depth_map: a (H, W) or (H, W, 1) depth image
+    :param image_points: a (..., 2) array of pixel coordinates
+    :param radius: the half side of the median window, 0 to take the pixel depth
+    :return: the (...) array of depths, 0 where no valid depth is available
+    """
+    depth_map = np.asarray(depth_map)
+    if depth_map.ndim == 3:
+        depth_map = depth_map[..., 0]
+    image_points = np.asarray(image_points, dtype=np.float64)
+    offsets = np.arange(-radius, radius + 1)
+    rows = np.clip(image_points[..., 1].astype(np.intp)[..., None, None] + offsets[:, None],
+                   a_min=0, a_max=depth_map.shape[0] - 1)
+    cols = np.clip(image_points[..., 0].astype(np.intp)[..., None, None] + offsets[None, :],
+                   a_min=0, a_max=depth_map.shape[1] - 1)
+    windows = depth_map[rows, cols].reshape(image_points.shape[:-1] + (-1,)).astype(np.float64)
+    if radius == 0:
+        return windows[..., 0]
+    # median of the valid depths: invalid ones are sorted last
+    windows[windows <= 0] = np.inf
+    windows.sort(axis=-1)
+    valid = np.sum(np.isfinite(windows), axis=-1)
+    low = np.take_along_axis(windows, np.maximum(valid - 1, 0)[..., None] // 2, axis=-1)[..., 0]
+    high = np.take_along_axis(windows, (valid // 2)[..., None], axis=-1)[..., 0]
+    return np.where(valid > 0, (low + high) / 2, 0.)
+
+
+def extract_model_info_batch(image_joints, depths=None, cal=None):
+    """
+    Vectorized extract_model_info over many hands at once
+    :param image_joints: a (..., 2) array of image joint coordinates, ex: (N, 21, 2)
+    :param depths: the optional (...) array of measured depths in sensor units, 0 where not available
+    :param cal: the camera calibration to be used for mapping
+    :return: (lines, points) arrays of shape (..., 3)
+            lines: the versors of the lines where each joint lies
+            points: the depth-complete points, NaN where no depth is available
+    """
+    if cal is None:
+        cal = current_calibration
+    if depths is None:
+        lines = unproject(image_joints, calibration=cal)
+        return lines, np.full(shape=lines.shape, fill_value=np.nan)
+    # points with depth lie on their line: normalizing them gives the line versors
+    points = unproject(image_joints, depths, calibration=cal)
+    lines = points / norm(points, axis=-1, keepdims=True)
+    points[~np.broadcast_to(np.asarray(depths) > 0, shape=points.shape[:-1])] = np.nan
+    return lines, points
+
+
+def model_info_format(lines, points):
+    """
+    Convert the array model info of one hand as given by extract_model_info_batch
+    into the standard hand-formatted one of extract_model_info
+    :param lines: the (21, 3) line versors
+    :param points: the (21, 3) depth points, NaN where not available
+    :return: (line, depth) standard dict-formatted hand info
+    """
+    return hand_format(list(lines)), hand_format([None if np.isnan(p[0]) else p for p in points])
@@ -1,7 +1,8 @@
 from library.geometry.hand_localization.parameters import *
 from library.geometry.numerical.finger_cone_sectors import *
 from library.geometry.transforms import get_rotation_matrix, get_mapping_rot, get_rotation_angle_around_axis
-from library.geometry.hand_localization.depth_suggestion import depth_info_compare
+from library.geometry.hand_localization.depth_suggestion import depth_info_compare, depth_info_compare_batch, \
+    measured_points
 
 
 # ################################## LOW LEVEL UTILS ############################
@@ -26,14 +27,26 @@ def sphere_line_intersection(center, radius, line):
     delta = bh ** 2 - np.dot(center, center) + radius ** 2
     if delta < 0:
         sol = - bh * line
-        return sol, sol, norm(np.cross(sol, line)) * 1e+20, True
+        # the loss is the distance of the center from the line (as norm(cross(center, line)), but cheaper)
+        return sol, sol, np.sqrt(radius ** 2 - delta) * 1e+20, True
     return (np.sqrt(delta) - bh) * line, (-bh - np.sqrt(delta)) * line, 0, False
 
 
 # ################################### LOW LEVEL FINGER COMPUTATION ################################
 
 
-def build_finger_num(basejoint, lengths, jointversors, depthsugg, config=None):
+def build_finger_num(basejoint, lengths, jointversors, depthsugg, config=None, previous_dirs=None):
+    """
+    Build the finger joints one by one, each constrained in its cone sector
+    :param basejoint: the position of the joint the finger starts from
+    :param lengths: the lengths of the phalanges
+    :param jointversors: the versors of the lines where each joint should lie
+    :param depthsugg: the depth-measured joints, None where not available
+    :param config: the finger-building configuration (see parameters)
+    :param previous_dirs: the optional directions of the phalanges in the previous frame,
+                          used as additional starting suggestions
+    :return: the list of the finger joints
+    """
     if len(lengths) == 0:
         return []
 
@@ -66,6 +79,8 @@ def build_finger_num(basejoint, lengths, jointversors, depthsugg, config=None):
 
     if depthsugg[0] is not None:
         numeric_suggest_list.append(depthsugg[0])
+    if previous_dirs is not None:
+        numeric_suggest_list.append(basejoint + previous_dirs[0] * lengths[0])
     joint = find_best_point_in_cone(center=basejoint,
                                     radius=lengths[0],
                                     objline=jointversors[0],
@@ -83,50 +98,102 @@ def build_finger_num(basejoint, lengths, jointversors, depthsugg, config=None):
                                       lengths=lengths[1:],
                                       jointversors=jointversors[1:],
                                       depthsugg=depthsugg[1:],
-                                      config=compute_config(joint))
+                                      config=compute_config(joint),
+                                      previous_dirs=previous_dirs[1:] if previous_dirs is not None else None)
 
 
-def build_finger_fast(basejoint, lengths, jointversors, depthsugg):
-    if len(lengths) == 0:
-        return [], 0
-
-    p1, p2, loss, degen = sphere_line_intersection(center=basejoint,
-                                                   radius=lengths[0],
-                                                   line=jointversors[0])
-    p1 = depth_info_compare(inferred=p1,
-                            measured=depthsugg[0],
-                            threshold=norm(p1 - basejoint))
-    if degen:
-        finger, moreloss = build_finger_fast(p1,
-                                             lengths[1:],
-                                             jointversors[1:],
-                                             depthsugg[1:])
-        return [p1] + finger, loss + moreloss
-    finger1, moreloss1 = build_finger_fast(p1,
-                                           lengths[1:],
-                                           jointversors[1:],
-                                           depthsugg[1:])
-    if moreloss1 == 0:
-        return [p1] + finger1, 0
-    p2 = depth_info_compare(inferred=p2,
-                            measured=depthsugg[0],
-                            threshold=norm(p2 - basejoint))
-    finger2, moreloss2 = build_finger_fast(p2,
-                                           lengths[1:],
-                                           jointversors[1:],
-                                           depthsugg[1:])
-    if moreloss2 < moreloss1:
-        return [p2] + finger2, moreloss2
-    return [p1] + finger1, moreloss1
+def build_finger_fast(basejoint, lengths, jointversors, depthsugg, max_candidates=FAST_FINGER_MAX_CANDIDATES):
+    """
+    Build the finger joints as intersections of the phalanx spheres with the joint lines, ignoring the cones.
+    Each joint has up to two intersections, so the candidates form a binary tree, explored depth-first
+    with branch and bound: a branch is dropped as soon as its partial loss is not below the best complete one.
+    :param basejoint: the position of the joint the finger starts from
+    :param lengths: the lengths of the phalanges
+    :param jointversors: the versors of the lines where each joint should lie
+    :param depthsugg: the depth-measured joints, None where not available
+    :param max_candidates: the maximum number of candidate joints explored. When exhausted,
+                           the remaining joints are completed greedily with the first intersection.
+                           A finger (three phalanges) has at most 2+4+8=14 candidates, so the cap
+                           only matters for longer chains
+    :return: a tuple (joints, loss), where loss measures how far the lines are from being reached
+    """
+    budget = [max_candidates]
+    measured = measured_points(depthsugg)
+
+    def intersections(level, base):
+        p1, p2, loss, degen = sphere_line_intersection(center=base,
+                                                       radius=lengths[level],
+                                                       line=jointversors[level])
+        points = np.array([p1] if degen else [p1, p2])
+        # both intersections are compared with the measure at once
+        candidates = list(depth_info_compare_batch(inferred=points,
+                                                   measured=measured[level],
+                                                   threshold=norm(points - base, axis=1)))
+        if len(candidates) == 2 and np.array_equal(candidates[0], candidates[1]):
+            candidates.pop()
+        return candidates, loss
+
+    def search(level, base, bound):
+        # the best completion from this joint on, None if its loss can not be lower than bound
+        if level == len(lengths):
+            return [], 0
+        candidates, loss = intersections(level, base)
+        if loss >= bound:
+            return None
+        best = None
+        for joint in candidates:
+            if best is not None and (best[1] == 0 or budget[0] <= 0):
+                break
+            budget[0] -= 1
+            rest = search(level + 1, joint, (bound if best is None else best[1]) - loss)
+            if rest is not None:
+                best = [joint] + rest[0], rest[1] + loss
+        return best
+
+    return search(0, np.asarray(basejoint, dtype=np.float64), np.inf)
 
 
 # ####################################### HIGH LEVEL FINGER COMPUTATION ##################################
 
-def compute_generic_finger_wrap(first_hand_model, palm_base_axis, lines_info, depth_sugg):
-    return lambda f: compute_generic_finger(first_hand_model, palm_base_axis, lines_info, depth_sugg, finger=f)
+def phalanx_directions(chain):
+    """
+    The directions of the phalanges of a chain of joints, None if the chain is None
+    """
+    if chain is None:
+        return None
+    return [normalize(chain[idx + 1] - chain[idx]) for idx in range(len(chain) - 1)]
+
+
+def finger_task(first_hand_model, palm_base_axis, lines_info, depth_sugg, finger, previous=None):
+    """
+    Pack the data needed to compute a finger (but the thumb) into a compact tuple of arrays,
+    cheap to send to another process
+    :return: the task to be given to solve_finger_task
+    """
+    depth = measured_points(depth_sugg[finger])
+    return (finger,
+            np.array(first_hand_model[finger]),
+            np.asarray(palm_base_axis),
+            np.array(lines_info[finger]),
+            depth,
+            None if previous is None else np.array(previous))
+
+
+def solve_finger_task(task):
+    """
+    Compute a finger from a task packed by finger_task (ex: in a worker process)
+    :return: a (3, 3) array of the finger joints but the base one
+    """
+    finger, base_joints, palm_base_axis, lines, depth, previous = task
+    return np.array(compute_generic_finger(first_hand_model={finger: list(base_joints)},
+                                           palm_base_axis=palm_base_axis,
+                                           lines_info={finger: list(lines)},
+                                           depth_sugg={finger: [None if np.isnan(d[0]) else d for d in depth]},
+                                           finger=finger,
+                                           previous=previous))
 
 
-def compute_generic_finger(first_hand_model, palm_base_axis, lines_info, depth_sugg, finger):
+def compute_generic_finger(first_hand_model, palm_base_axis, lines_info, depth_sugg, finger, previous=None):
     # the build finger utility needs complex configuration, here we build it
     conf = {NORM_DIR: palm_base_axis,
             START_DIR: normalize(first_hand_model[finger][1] - first_hand_model[finger][0])
@@ -143,11 +210,12 @@ def compute_generic_finger(first_hand_model, palm_base_axis, lines_info, depth_s
                                        lengths=lengths,
                                        jointversors=lines_info[finger][1:],
                                        config=conf,
-                                       depthsugg=depth_sugg[finger][1:])
+                                       depthsugg=depth_sugg[finger][1:],
+                                       previous_dirs=phalanx_directions(previous))
     return finger_position
 
 
-def compute_thumb(first_hand_model, palm_base_axis, lines_info, depth_sugg):
+def compute_thumb(first_hand_model, palm_base_axis, lines_info, depth_sugg, previous=None):
     conf = {NORM_DIR: palm_base_axis,
             START_DIR: normalize(first_hand_model[THUMB][1] - first_hand_model[WRIST][0])}
     end_model = [0, 0, 0, 0]
@@ -167,7 +235,8 @@ def compute_thumb(first_hand_model, palm_base_axis, lines_info, depth_sugg):
                                lengths=lengths,
                                jointversors=lines,
                                config=conf,
-                               depthsugg=depth_sugg[THUMB][1:])
+                               depthsugg=depth_sugg[THUMB][1:],
+                               previous_dirs=phalanx_directions(previous))
     for idx in range(1, 4):
         end_model[idx] = thmbend[idx - 1]
 
@@ -1,20 +1,28 @@
 from library.geometry.hand_localization.fingers import *
 from library.geometry.hand_localization.parameters import *
 from library.geometry.calibration import *
-from library.geometry.hand_localization.depth_suggestion import extract_model_info, depth_info_compare
-from library.geometry.numerical.palm_threepts_inference import get_points_projection_to_lines_pair
+from library.geometry.hand_localization.depth_suggestion import extract_model_info, depth_info_compare_batch, \
+    measured_points, score_depth_hypotheses
+from library.geometry.numerical.palm_threepts_inference import get_points_projection_to_lines_pair, PalmSolver
 from library.geometry.transforms import get_rotation_matrix, get_mapping_rot, normalize, get_rotation_angle_around_axis
 from numpy.linalg import norm
 
 
-def compute_hand_world_joints(base_hand_model, image_joints, side=RIGHT, cal=None, executor=None):
+def compute_hand_world_joints(base_hand_model, image_joints, side=RIGHT, cal=None, executor=None, palm_solver=None,
+                              tracking_state=None):
     """
     Compute the hand model in the space
     :param base_hand_model: the standard hand prototype to use for interpolation
     :param image_joints: the image points of the joints
     :param side: one of RIGHT or LEFT, the side of the hand
     :param cal: the calibration of the image joints to use
-    :param executor: the optional executor pool to use to try to accelerate the process
+    :param executor: the optional executor pool to use to try to accelerate the process.
+                     A process pool (see ProcessPoolManager) runs the fingers on multiple cores
+    :param palm_solver: the optional PalmSolver to use for deterministic, bounded-time palm localization.
+                        If None, the palm is localized with random restarts.
+    :param tracking_state: an optional dictionary carried across consecutive frames of the same hand.
+                           The previous frame results found there are used as initial guesses,
+                           then it is updated with the current results. See HandTracker.
     :return: The space model of the hand
     """
     # First thing is: compute the world model correspondences of the image points
@@ -24,9 +32,28 @@ def compute_hand_world_joints(base_hand_model, image_joints, side=RIGHT, cal=Non
     lines_info, depth_info = extract_model_info(image_joints, cal)
     # disable depth for some debugs
     # depth_info = hand_format([None] * 21)
+    return compute_hand_world_joints_from_info(base_hand_model, lines_info, depth_info,
+                                               side=side, executor=executor, palm_solver=palm_solver,
+                                               tracking_state=tracking_state)
+
 
+def compute_hand_world_joints_from_info(base_hand_model, lines_info, depth_info, side=RIGHT, executor=None,
+                                        palm_solver=None, tracking_state=None):
+    """
+    Compute the hand model in the space from the camera-space information of the joints
+    :param base_hand_model: the standard hand prototype to use for interpolation
+    :param lines_info: the hand-formatted versors of the lines where each joint lies
+    :param depth_info: the hand-formatted depth-measured points, None where not available
+    :param side: one of RIGHT or LEFT, the side of the hand
+    :param executor: the optional executor pool to use to try to accelerate the process
+    :param palm_solver: the optional PalmSolver to use for the palm localization
+    :param tracking_state: the optional dictionary of the previous frame results, updated with the current ones
+    :return: The space model of the hand
+    """
     # the hand model is normalized with respect to the wrist
     base_hand_model = hand_format([elem - base_hand_model[WRIST][0] for elem in raw(base_hand_model)])
+    if tracking_state is None:
+        tracking_state = {}
 
     # based on the palm plane, extract the transformation that maps the model to the lines
     # conserving the distances between all points.
@@ -34,7 +61,20 @@ def compute_hand_world_joints(base_hand_model, image_joints, side=RIGHT, cal=Non
     tr, rotmat = get_best_first_transform(base_hand_model,
                                           lines_info=lines_info,
                                           depth_sugg=depth_info,
-                                          side=side)
+                                          side=side,
+                                          palm_solver=palm_solver,
+                                          tracking_state=tracking_state)
+
+    # bring the previous frame hand in the current palm pose to suggest where the fingers are
+    previous_chains = {fin: None for fin in FINGERS}
+    if PREV_MODEL in tracking_state:
+        delta_rot = rotmat @ tracking_state[PREV_ROTATION].T
+        previous_model = hand_format([first_transform_point(delta_rot, tr, p - tracking_state[PREV_TRANSLATION])
+                                      for p in raw(tracking_state[PREV_MODEL])])
+        for fin in (INDEX, MIDDLE, RING, BABY):
+            previous_chains[fin] = previous_model[fin]
+        # the thumb chain starts from the wrist
+        previous_chains[THUMB] = previous_model[WRIST] + previous_model[THUMB][1:]
 
     # apply this first transformation to the whole model
     first_hand_model = hand_format([first_transform_point(rotmat, tr, p)
@@ -50,12 +90,10 @@ def compute_hand_world_joints(base_hand_model, image_joints, side=RIGHT, cal=Non
 
     # now correct them with some depth measured information
     depth_tolerance = norm(first_hand_model[INDEX][0] - first_hand_model[BABY][0]) / 3
-    first_hand_model[MIDDLE][0] = depth_info_compare(inferred=first_hand_model[MIDDLE][0],
-                                                     measured=depth_info[MIDDLE][0],
-                                                     threshold=depth_tolerance)
-    first_hand_model[RING][0] = depth_info_compare(inferred=first_hand_model[RING][0],
-                                                   measured=depth_info[RING][0],
-                                                   threshold=depth_tolerance)
+    first_hand_model[MIDDLE][0], first_hand_model[RING][0] = \
+        depth_info_compare_batch(inferred=[first_hand_model[MIDDLE][0], first_hand_model[RING][0]],
+                                 measured=measured_points([depth_info[MIDDLE][0], depth_info[RING][0]]),
+                                 threshold=depth_tolerance)
 
     # now we have to face the fingers: start getting the palm direction
     palm_base_axis = normalize(np.cross(first_hand_model[INDEX][0] - first_hand_model[WRIST][0],
@@ -71,7 +109,8 @@ def compute_hand_world_joints(base_hand_model, image_joints, side=RIGHT, cal=Non
                                                      palm_base_axis=palm_base_axis,
                                                      lines_info=lines_info,
                                                      finger=fin,
-                                                     depth_sugg=depth_info)
+                                                     depth_sugg=depth_info,
+                                                     previous=previous_chains[fin])
             end_model[fin] = [first_hand_model[fin][0], 0, 0, 0]
             for idx in range(1, 4):
                 end_model[fin][idx] = finger_position[idx - 1]
@@ -80,24 +119,27 @@ def compute_hand_world_joints(base_hand_model, image_joints, side=RIGHT, cal=Non
         end_model[THUMB] = compute_thumb(first_hand_model=first_hand_model,
                                          palm_base_axis=palm_base_axis,
                                          lines_info=lines_info,
-                                         depth_sugg=depth_info)
+                                         depth_sugg=depth_info,
+                                         previous=previous_chains[THUMB])
 
     else:
-        # if some angel provided any executor, schedule the four fingers
+        # if some angel provided any executor, schedule the four fingers.
+        # Tasks are packed as small arrays, so that also process pools can be used
         futures = {}
-        task = compute_generic_finger_wrap(first_hand_model=first_hand_model,
-                                           palm_base_axis=palm_base_axis,
-                                           lines_info=lines_info,
-                                           depth_sugg=depth_info)
-
         for fin in (INDEX, MIDDLE, RING, BABY):
-            futures[fin] = executor.submit(task, fin)
+            futures[fin] = executor.submit(solve_finger_task, finger_task(first_hand_model=first_hand_model,
+                                                                          palm_base_axis=palm_base_axis,
+                                                                          lines_info=lines_info,
+                                                                          depth_sugg=depth_info,
+                                                                          finger=fin,
+                                                                          previous=previous_chains[fin]))
 
         # and then solve the thumb problem
         end_model[THUMB] = compute_thumb(first_hand_model=first_hand_model,
                                          palm_base_axis=palm_base_axis,
                                          lines_info=lines_info,
-                                         depth_sugg=depth_info)
+                                         depth_sugg=depth_info,
+                                         previous=previous_chains[THUMB])
 
         # finally harvest the results
         for fin in (INDEX, MIDDLE, RING, BABY):
@@ -105,6 +147,9 @@ def compute_hand_world_joints(base_hand_model, image_joints, side=RIGHT, cal=Non
             for idx in range(1, 4):
                 end_model[fin][idx] = futures[fin].result()[idx - 1]
 
+    tracking_state[PREV_MODEL] = end_model
+    tracking_state[PREV_TRANSLATION] = tr
+    tracking_state[PREV_ROTATION] = rotmat
     # and finally we have it
     return end_model
 
@@ -117,7 +162,7 @@ def first_transform_point(rotmat, translation, point):
     return (rotmat @ point) + translation
 
 
-def get_best_first_transform(base_hand_model, lines_info, depth_sugg, side):
+def get_best_first_transform(base_hand_model, lines_info, depth_sugg, side, palm_solver=None, tracking_state=None):
     """
     Extract the geometrical transformation that interpolates WRIST, INDEX base and BABY base
     with the given world model. Based on the suggested side, a RIGHT or LEFT hand is returned
@@ -125,25 +170,27 @@ def get_best_first_transform(base_hand_model, lines_info, depth_sugg, side):
     :param lines_info: the model lines stating where all joints should lie
     :param depth_sugg: the set of the depth-wise measures to take into account
     :param side: RIGHT or LEFT, depending on the seen hand
+    :param palm_solver: the optional PalmSolver to use, if None a random restarts solver is used
+    :param tracking_state: the optional dictionary of the previous frame results. If the palm has not moved much,
+                           the solution nearest to the previous palm is taken without checking the hand side.
+                           The chosen palm is stored back in it.
     :return: a tuple of the form (tr, rotmat) containing the selected translation and rotation to
             be applied to the base hand model.
     """
     base_triangle_pts = [base_hand_model[WRIST][0], base_hand_model[INDEX][0], base_hand_model[BABY][0]]
     base_triangle_lines = [lines_info[WRIST][0], lines_info[INDEX][0], lines_info[BABY][0]]
-    model1, model2 = get_points_projection_to_lines_pair(base_triangle_pts, base_triangle_lines)
+    if palm_solver is None:
+        model1, model2 = get_points_projection_to_lines_pair(base_triangle_pts, base_triangle_lines)
+    else:
+        model1, model2 = palm_solver.solve_pair(base_triangle_pts, base_triangle_lines)
 
     base_tr = norm(base_hand_model[MIDDLE][0] - base_hand_model[WRIST][0])
+    palm_depths = measured_points([depth_sugg[WRIST][0], depth_sugg[INDEX][0], depth_sugg[BABY][0]])
 
     def model_depthwise_correction(model):
-        model[0] = depth_info_compare(inferred=model[0],
-                                      measured=depth_sugg[WRIST][0],
-                                      threshold=base_tr)
-        model[1] = depth_info_compare(inferred=model[1],
-                                      measured=depth_sugg[INDEX][0],
-                                      threshold=base_tr)
-        model[2] = depth_info_compare(inferred=model[2],
-                                      measured=depth_sugg[BABY][0],
-                                      threshold=base_tr)
+        model[:] = depth_info_compare_batch(inferred=model,
+                                            measured=palm_depths,
+                                            threshold=base_tr)
 
     def get_transformation_from_model(model):
         # translation default to wrist
@@ -159,6 +206,28 @@ def get_best_first_transform(base_hand_model, lines_info, depth_sugg, side):
         rotmat = np.matmul(get_rotation_matrix(axis, angle), rotmat)
         return tr, rotmat
 
+    if tracking_state is None:
+        tracking_state = {}
+    tracking_state[WARM_PALM] = False
+    if PREV_PALM in tracking_state:
+        # consecutive frames: the palm is the solution nearest to the previous one, if near enough
+        shifts = [np.max(norm(model - tracking_state[PREV_PALM], axis=1)) for model in (model1, model2)]
+        if min(shifts) < MAX_PALM_SHIFT * base_tr:
+            model = model1 if shifts[0] <= shifts[1] else model2
+            model_depthwise_correction(model)
+            tracking_state[PREV_PALM] = np.array(model)
+            tracking_state[WARM_PALM] = True
+            return get_transformation_from_model(model)
+
+    # the two palms lie on the same lines at different depths: if the measures clearly
+    # agree with one of them, take it without estimating the side of the hand
+    scores = score_depth_hypotheses(np.array([model1, model2]), measured=palm_depths, threshold=base_tr)
+    if abs(scores[0] - scores[1]) > PALM_DEPTH_MARGIN:
+        model = model1 if scores[0] < scores[1] else model2
+        model_depthwise_correction(model)
+        tracking_state[PREV_PALM] = np.array(model)
+        return get_transformation_from_model(model)
+
     model_depthwise_correction(model1)
 
     tr1, rotmat1 = get_transformation_from_model(model1)
@@ -176,6 +245,8 @@ def get_best_first_transform(base_hand_model, lines_info, depth_sugg, side):
     avg_fingers = avg_fingers / len(FINGERS)
 
     if np.dot(avg_fingers - model1[0], model_axis_unnorm) > 0:
+        tracking_state[PREV_PALM] = np.array(model1)
         return tr1, rotmat1
     model_depthwise_correction(model2)
+    tracking_state[PREV_PALM] = np.array(model2)
     return get_transformation_from_model(model2)
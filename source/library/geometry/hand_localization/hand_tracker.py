@@ -0,0 +1,64 @@
+from library.geometry.hand_localization.hand_localization_num import compute_hand_world_joints
+from library.geometry.hand_localization.parameters import *
+from library.geometry.numerical.palm_threepts_inference import PalmSolver
+
+
+class HandTracker:
+    """
+    Reconstruction of the same hand along consecutive frames of a sequence.
+    The results of each frame are kept and used to initialize the next one:
+        - the palm solver refines the previous palm solution before searching for new ones
+        - the palm orientation is taken as the one nearest to the previous palm,
+          skipping the side check, as long as the palm has not moved too much
+        - the previous finger directions, brought in the current palm pose,
+          are added to the starting points of each finger cone search
+    Call reset whenever the sequence is interrupted (ex: the hand is lost or the video is cut).
+    """
+    def __init__(self, base_hand_model, side=RIGHT, cal=None, executor=None):
+        """
+        :param base_hand_model: the standard hand prototype to use for interpolation
+        :param side: one of RIGHT or LEFT, the side of the tracked hand
+        :param cal: the calibration of the image joints to use
+        :param executor: the optional executor pool to use to try to accelerate the process
+        """
+        self.base_hand_model = base_hand_model
+        self.side = side
+        self.cal = cal
+        self.executor = executor
+        self.palm_solver = PalmSolver(warm_start=True)
+        self.state = {}
+        self.frames = 0
+        self.warm_palms = 0
+
+    def reset(self):
+        """
+        Forget the previous frames, the next one will be solved from scratch
+        """
+        self.palm_solver.reset()
+        self.state = {}
+
+    def track(self, image_joints):
+        """
+        Compute the hand model in the space for the next frame of the sequence
+        :param image_joints: the image joints of the frame, as for compute_hand_world_joints
+        :return: the space model of the hand
+        """
+        model = compute_hand_world_joints(self.base_hand_model, image_joints,
+                                          side=self.side,
+                                          cal=self.cal,
+                                          executor=self.executor,
+                                          palm_solver=self.palm_solver,
+                                          tracking_state=self.state)
+        self.frames += 1
+        if self.state.get(WARM_PALM, False):
+            self.warm_palms += 1
+        return model
+
+    def stats(self):
+        """
+        :return: a dictionary with the number of tracked frames, how many of them
+                 reused the previous palm, and the statistics of the palm solver
+        """
+        return {'frames': self.frames,
+                'warm_palms': self.warm_palms,
+                'palm_solver': dict(self.palm_solver.stats)}
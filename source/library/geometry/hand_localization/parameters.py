@@ -47,10 +47,28 @@ for finger in FINGERS:
         NORM_DIR: np.cos(normdirangles[finger]) ** 2
     }
 
+# Maximum number of candidate joints explored by the fast finger search,
+# never reached by a three phalanges finger (at most 14 candidates)
+FAST_FINGER_MAX_CANDIDATES = 32
+
+# Definitions for the state carried across consecutive frames of the same hand (see HandTracker)
+PREV_MODEL = 'pm'           # The previous frame world model of the hand
+PREV_TRANSLATION = 'pt'     # The previous frame translation of the prototype
+PREV_ROTATION = 'pr'        # The previous frame rotation of the prototype
+PREV_PALM = 'pp'            # The previous frame WRIST, INDEX and BABY base points
+WARM_PALM = 'wp'            # Whether the palm of the last frame was chosen from the previous one
+# Maximum displacement of the palm points, relative to the palm size,
+# to choose the palm orientation from the previous frame instead of solving it again
+MAX_PALM_SHIFT = 0.25
+
 # Definitions for the LEFT-RIGHT detection. VALUES ARE SIGNIFICANT, DO NOT MODIFY.
 LEFT = -1
 RIGHT = 1
 
+# Minimum difference of the depth scores (see score_depth_hypotheses) of the two palm solutions
+# to choose the palm by depth, without estimating the side of the hand from the fingers
+PALM_DEPTH_MARGIN = 0.25
+
 # Number of fast finger estimates to find out what side is the palm
 SIDE_N_ESTIM = 3
 # Fingers used to estimate the side of the hand
@@ -1,11 +1,12 @@
 from library.geometry.formatting import *
 from library.geometry.transforms import *
+from library.geometry.calibration import unproject, image_points_arrays
 
 
 def extract_prototype(imagepts, cal):
     if not all([pt.visible for pt in imagepts]):
         return None
-    pts_cloud = np.array([p.to_camera_model(calibration=cal).as_row() for p in imagepts])
+    pts_cloud = unproject(*image_points_arrays(imagepts), calibration=cal)
     pts_cloud = hand_format(pts_cloud - pts_cloud[0])
 
     rot1 = get_mapping_rot(pts_cloud[INDEX][3], [1, 0, 0])
@@ -1,16 +1,18 @@
 from library.geometry.calibration import ImagePoint
+from library.geometry.hand_localization.depth_suggestion import sample_depths
 import numpy as np
 
 
-def extract_imgpoints(labels, depthimg):
-    out = []
-    resx = np.shape(depthimg)[1]
-    resy = np.shape(depthimg)[0]
-    for (x, y, occluded) in labels:
-        coords = x * resx, y * resy
-        if not occluded:
-            out.append(ImagePoint(coords=coords,
-                                  depth=depthimg[int(coords[1]), int(coords[0]), 0]))
-        else:
-            out.append(ImagePoint(coords=coords))
-    return np.array(out)
+def extract_imgpoints(labels, depthimg, radius=0):
+    """
+    Build the image points of the labelled joints, with their depth
+    :param labels: the normalized (x, y, occluded) joint labels
+    :param depthimg: the depth image
+    :param radius: the half side of the median window used to sample the depths, 0 to take the pixel depth
+    :return: the array of ImagePoint, occluded joints have no depth
+    """
+    labels = np.asarray(labels, dtype=np.float64)
+    coords = labels[:, 0:2] * [np.shape(depthimg)[1], np.shape(depthimg)[0]]
+    depths = sample_depths(depthimg, coords, radius=radius)
+    return np.array([ImagePoint(coords=tuple(c)) if occluded else ImagePoint(coords=tuple(c), depth=d)
+                     for c, d, occluded in zip(coords, depths, labels[:, 2])])
@@ -1,8 +1,14 @@
+from functools import lru_cache
+
 import numpy as np
 from numpy.linalg import norm
 from library.geometry.transforms import normalize
 from scipy.optimize import brentq
 
+# the root of boundary_distance is searched in this interval of the line combination coefficient
+MIN_K = 1e-10
+MAX_K = 1.0
+
 
 def compute_sphere_intersection(center, radius, line, sign=None):
     # <tv-c, tv-c> = r2
@@ -72,7 +78,46 @@ def boundary_distance(k, start_line, reference_line,
     return min(norm_cos_diff, plane_cos_diff)
 
 
-def find_best_point_in_cone(center, norm_vers, tang_vers, radius, normcos, planecos, objline):
+@lru_cache(maxsize=16)
+def k_grid(samples):
+    """
+    The grid of line combination coefficients where boundary_distance is tabulated
+    """
+    grid = np.linspace(MIN_K, MAX_K, samples)
+    grid.setflags(write=False)
+    return grid
+
+
+def boundary_distance_table(ks, start_line, reference_line,
+                            center, radius,
+                            norm_vers, tang_vers,
+                            normcos, planecos,
+                            sign, refstartdot):
+    """
+    Vectorized boundary_distance over an array of line combination coefficients.
+    Lines that do not reach the sphere are given -inf.
+    """
+    h = -ks * refstartdot + np.sqrt(1 + (refstartdot ** 2 - 1) * ks ** 2)
+    lines = ks[:, None] * start_line + h[:, None] * reference_line
+    bh = - lines @ center
+    delta = bh ** 2 - np.dot(center, center) + radius ** 2
+    points = (sign * np.sqrt(np.maximum(delta, 0)) - bh)[:, None] * lines
+    rel = points - center
+    rel_norm = rel @ norm_vers
+    rel_tang = rel @ tang_vers
+    norm_cos_diff = rel_norm / radius - normcos
+    # the projection on the plane of norm_vers and tang_vers has norm sqrt(rel_norm^2 + rel_tang^2)
+    plane_cos_diff = np.sqrt(rel_norm ** 2 + rel_tang ** 2) / radius - planecos
+    return np.where(delta >= 0, np.minimum(norm_cos_diff, plane_cos_diff), -np.inf)
+
+
+def find_best_point_in_cone(center, norm_vers, tang_vers, radius, normcos, planecos, objline, samples=None):
+    """
+    Find the point of the cone sector on the sphere nearest to the objective line
+    :param samples: if None, the boundary of the cone sector is found by a brentq root search.
+                    Else boundary_distance is tabulated all at once on a grid of this many samples,
+                    and the root is refined by tabulating again the bracketing interval.
+    """
 
     def checknorm(subj):
         nrm = norm(subj)
@@ -123,9 +168,17 @@ def find_best_point_in_cone(center, norm_vers, tang_vers, radius, normcos, plane
                          refstartdot=refstartdot) >= 0:
         return compute_sphere_intersection(center, radius, start_line, sign)
 
+    if samples is not None:
+        k = table_root(samples, start_line, reference_versor, center, radius, norm_vers, tang_vers,
+                       normcos, planecos, sign, refstartdot)
+        return compute_sphere_intersection(center,
+                                           radius,
+                                           line_combination(start_line, reference_versor, k, refstartdot),
+                                           sign)
+
     k = brentq(f=boundary_distance,
-               a=1e-10,
-               b=1.0,
+               a=MIN_K,
+               b=MAX_K,
                args=(start_line,
                      reference_versor,
                      center,
@@ -143,3 +196,29 @@ def find_best_point_in_cone(center, norm_vers, tang_vers, radius, normcos, plane
                                                         k,
                                                         refstartdot),
                                        sign)
+
+
+def table_root(samples, *args):
+    """
+    Find the root of boundary_distance nearest to the start line from its table.
+    The bracketing interval is tabulated once more, then the root is linearly interpolated.
+    :param samples: the number of samples of the tables
+    :param args: the other arguments of boundary_distance
+    :return: the line combination coefficient of the root
+    """
+    ks = k_grid(samples)
+    table = boundary_distance_table(ks, *args)
+    for refinement in range(2):
+        inside = np.flatnonzero(table >= 0)
+        if len(inside) == 0:
+            return ks[0]
+        idx = inside[-1]
+        if idx == len(ks) - 1:
+            return ks[idx]
+        if refinement == 0:
+            ks = ks[idx] + (ks[idx + 1] - ks[idx]) * k_grid(samples)
+            table = boundary_distance_table(ks, *args)
+    k0, k1, d0, d1 = ks[idx], ks[idx + 1], table[idx], table[idx + 1]
+    if not np.isfinite(d1):
+        return k0
+    return k0 - d0 * (k1 - k0) / (d1 - d0)
@@ -1,4 +1,4 @@
-from scipy.optimize import fsolve
+from scipy.optimize import fsolve, brentq
 from library.geometry.transforms import *
 import numpy as np
 
@@ -75,3 +75,172 @@ def get_points_projection_to_lines_pair(basepts, lines, maxerr=1e-3, maxrestart=
                                                maxerr=maxerr,
                                                maxrestart=maxrestart)
     return pts, pts2
+
+
+# DETERMINISTIC BOUNDED-COST INFERENCE
+# Fixing the depth t0 along the first line, the first two distance equations give t1 and t2
+# in closed form (two branches each). The last equation becomes a scalar function of t0,
+# whose roots are bracketed on a fixed grid and refined by brentq with a bounded iteration budget.
+# Optionally the previous frame solutions are refined by a few Newton steps instead.
+
+
+def line_projection_residual(sols, cosines, dists):
+    """
+    Vectorized line_projection_system.
+    :param sols: a (..., 3) array of depths along the three lines
+    :param cosines: the array of cosines between lines (c01, c02, c12)
+    :param dists: the array of distances between points (d01, d02, d12)
+    :return: the (..., 3) residuals
+    """
+    t0, t1, t2 = sols[..., 0], sols[..., 1], sols[..., 2]
+    return np.stack((t0 ** 2 - 2 * cosines[0] * t0 * t1 + t1 ** 2 - dists[0] ** 2,
+                     t0 ** 2 - 2 * cosines[1] * t0 * t2 + t2 ** 2 - dists[1] ** 2,
+                     t1 ** 2 - 2 * cosines[2] * t1 * t2 + t2 ** 2 - dists[2] ** 2), axis=-1)
+
+
+def line_projection_jacobian(sols, cosines):
+    t0, t1, t2 = sols
+    return np.array([[2 * t0 - 2 * cosines[0] * t1, 2 * t1 - 2 * cosines[0] * t0, 0],
+                     [2 * t0 - 2 * cosines[1] * t2, 0, 2 * t2 - 2 * cosines[1] * t0],
+                     [0, 2 * t1 - 2 * cosines[2] * t2, 2 * t2 - 2 * cosines[2] * t1]])
+
+
+def branch_depths(t0, cosine, dist, sign):
+    """
+    Depths along a line at distance dist from the point at depth t0 along a line forming the given cosine.
+    """
+    disc = np.maximum(dist ** 2 - t0 ** 2 * (1 - cosine ** 2), 0)
+    return cosine * t0 + sign * np.sqrt(disc)
+
+
+class PalmSolver:
+    """
+    Deterministic solver for the three palm points projection problem with bounded cost per call.
+    Keeps the solutions of the last call to warm start the next one (consecutive frames of a video)
+    and collects convergence statistics.
+    """
+    def __init__(self, samples=64, maxiter=30, maxerr=1e-3, newton_steps=8, warm_start=True):
+        """
+        :param samples: number of grid points used to bracket the roots in a cold solve
+        :param maxiter: maximum brentq iterations for each bracketed root
+        :param maxerr: maximum residual norm (relative to the squared distances) of an accepted solution
+        :param newton_steps: maximum Newton steps when refining the previous solutions
+        :param warm_start: if True, the previous solutions are tried before a cold solve
+        """
+        self.samples = samples
+        self.maxiter = maxiter
+        self.maxerr = maxerr
+        self.newton_steps = newton_steps
+        self.warm_start = warm_start
+        self.previous = None
+        self.stats = None
+        self.reset_stats()
+
+    def reset(self):
+        """
+        Forget the previous solutions (ex: at the start of a new video)
+        """
+        self.previous = None
+
+    def reset_stats(self):
+        self.stats = {'calls': 0,
+                      'warm_solves': 0,
+                      'cold_solves': 0,
+                      'root_iterations': 0,
+                      'newton_steps': 0,
+                      'unconverged': 0,
+                      'max_error': 0.}
+
+    @staticmethod
+    def problem(basepts, lines):
+        cosines = np.array([np.dot(lines[0], lines[1]), np.dot(lines[0], lines[2]), np.dot(lines[1], lines[2])])
+        dists = np.array([np.linalg.norm(basepts[0] - basepts[1]),
+                          np.linalg.norm(basepts[0] - basepts[2]),
+                          np.linalg.norm(basepts[1] - basepts[2])])
+        return cosines, dists
+
+    def error(self, sol, cosines, dists):
+        return np.linalg.norm(line_projection_residual(sol, cosines, dists)) / np.max(dists) ** 2
+
+    def refine(self, start, cosines, dists):
+        sol = np.array(start, dtype=np.float64)
+        for _ in range(self.newton_steps):
+            self.stats['newton_steps'] += 1
+            res = line_projection_residual(sol, cosines, dists)
+            if np.linalg.norm(res) / np.max(dists) ** 2 < self.maxerr * 1e-3:
+                break
+            try:
+                sol = sol - np.linalg.solve(line_projection_jacobian(sol, cosines), res)
+            except np.linalg.LinAlgError:
+                break
+        return sol
+
+    def cold_solutions(self, cosines, dists):
+        """
+        Find all the solutions with positive first depth
+        :return: a list of (3,) depth arrays
+        """
+        sines2 = 1 - cosines[:2] ** 2
+        t0max = np.min(dists[:2] / np.sqrt(np.maximum(sines2, 1e-12)))
+        grid = np.linspace(t0max * 1e-6, t0max, self.samples)
+        solutions = []
+        for s1 in (1, -1):
+            for s2 in (1, -1):
+                def residual(t0):
+                    t1 = branch_depths(t0, cosines[0], dists[0], s1)
+                    t2 = branch_depths(t0, cosines[1], dists[1], s2)
+                    return t1 ** 2 - 2 * cosines[2] * t1 * t2 + t2 ** 2 - dists[2] ** 2
+
+                values = residual(grid)
+                for idx in np.nonzero(np.sign(values[:-1]) * np.sign(values[1:]) <= 0)[0]:
+                    t0, info = brentq(residual, grid[idx], grid[idx + 1],
+                                      maxiter=self.maxiter, full_output=True, disp=False)
+                    self.stats['root_iterations'] += info.iterations
+                    solutions.append(np.array([t0,
+                                               branch_depths(t0, cosines[0], dists[0], s1),
+                                               branch_depths(t0, cosines[1], dists[1], s2)]))
+        return solutions
+
+    def select_pair(self, solutions, cosines, dists):
+        """
+        Pick the two best distinct solutions, preferring the ones in front of the camera
+        """
+        solutions = sorted(solutions, key=lambda s: (np.any(s < 0), self.error(s, cosines, dists)))
+        distinct = []
+        for sol in solutions:
+            if all(np.linalg.norm(sol - other) > 1e-5 * np.max(dists) for other in distinct):
+                distinct.append(sol)
+            if len(distinct) == 2:
+                break
+        return distinct
+
+    def solve_pair(self, basepts, lines):
+        """
+        Solve the problem of get_points_projection_to_lines_pair
+        :param basepts: the three model points
+        :param lines: the three line versors where the points must lie
+        :return: two (possibly equal) (3, 3) arrays of points, the first one being the most reliable
+        """
+        self.stats['calls'] += 1
+        cosines, dists = self.problem(basepts, lines)
+        pair = []
+        if self.warm_start and self.previous is not None:
+            refined = [self.refine(prev, cosines, dists) for prev in self.previous]
+            refined = [s for s in refined if s[0] > 0 and self.error(s, cosines, dists) < self.maxerr]
+            pair = self.select_pair(refined, cosines, dists)
+            if len(pair) == 2:
+                self.stats['warm_solves'] += 1
+        if len(pair) < 2:
+            self.stats['cold_solves'] += 1
+            pair = self.select_pair(self.cold_solutions(cosines, dists), cosines, dists)
+        if len(pair) == 0:
+            # no exact solution: fall back to the closest point of the equations
+            pair = [self.refine(np.full(shape=(3,), fill_value=np.mean(dists)), cosines, dists)]
+        err = max(self.error(s, cosines, dists) for s in pair)
+        if err > self.maxerr:
+            self.stats['unconverged'] += 1
+        self.stats['max_error'] = max(self.stats['max_error'], err)
+        if len(pair) == 1:
+            pair = [pair[0], pair[0]]
+        self.previous = pair
+        return tuple(np.array([lines[i] * sol[i] for i in range(3)]) for sol in pair)
@@ -1,8 +1,23 @@
+import importlib.util
+import json
+import os
 import timeit
 
 from library.geometry.calibration import *
 from library.geometry.transforms import *
-from library.geometry.numerical.palm_threepts_inference import get_points_projection_to_lines_pair
+from library.geometry import transforms as numpy_transforms
+from library.geometry.numerical import finger_cone_sectors, finger_cone_sectors_red, finger_cone_sectors_opt
+from library.geometry.numerical.palm_threepts_inference import get_points_projection_to_lines_pair, PalmSolver
+from library.geometry.formatting import *
+from library.geometry.hand_localization.depth_suggestion import extract_model_info
+from library.geometry.hand_localization.fingers import build_finger_fast, compute_generic_finger
+from library.geometry.hand_localization.parameters import RIGHT
+from library.geometry.hand_localization.hand_localization_num import get_best_first_transform, first_transform_point, \
+    compute_hand_world_joints
+from library.utils.logging import log, WARNINGS
+
+# functions compared among the transforms backends
+TRANSFORMS_FUNCTIONS = ('get_rotation_matrix', 'get_mapping_rot', 'get_rotation_angle_around_axis')
 
 
 def inner_angle(v1, v2):
@@ -17,20 +32,12 @@ def projections_benchmark(repeat=1000):
     p2 = np.array(np.random.uniform(low=-5, high=5.0, size=(3,)))
     p3 = np.array(np.random.uniform(low=-5, high=5.0, size=(3,)))
     for i in range(repeat):
-        l1 = np.array(np.random.uniform(low=0, high=500, size=(2,)))
-        l2 = np.array(np.random.uniform(low=0, high=500, size=(2,)))
-        l3 = np.array(np.random.uniform(low=0, high=500, size=(2,)))
-
-        l1 = ImagePoint(l1).to_camera_model(cal).as_row()
-        l2 = ImagePoint(l2).to_camera_model(cal).as_row()
-        l3 = ImagePoint(l3).to_camera_model(cal).as_row()
+        lines = unproject(np.random.uniform(low=0, high=500, size=(3, 2)), calibration=cal)
 
         p1 = np.array(np.random.uniform(low=-5, high=5.0, size=(3,)))
         p2 = np.array(np.random.uniform(low=-5, high=5.0, size=(3,)))
         p3 = np.array(np.random.uniform(low=-5, high=5.0, size=(3,)))
 
-        lines = np.array([l1, l2, l3])
-
         basepts = np.array([p1, p2, p3])
 
         time = timeit.timeit(lambda: get_points_projection_to_lines_pair(basepts, lines), number=1)
@@ -45,6 +52,368 @@ def projections_benchmark(repeat=1000):
     return times, good_times
 
 
+def finger_search_benchmark(base_hand_model, hands, cal=None, side=RIGHT, repeat=10):
+    """
+    Compare the fast finger search (sphere-line intersections only) with the
+    numerical one (constrained to the finger cones) on recorded hands.
+    Both start from the same palm transformation.
+    :param base_hand_model: the hand prototype
+    :param hands: a list of image joints in hand format
+    :param cal: the calibration of the image joints
+    :param side: the side of the recorded hands
+    :param repeat: the number of timed calls per finger
+    :return: fast times, numerical times, distances between the joints found by the two
+    """
+    if cal is None:
+        cal = current_calibration
+    base_hand_model = hand_format([elem - base_hand_model[WRIST][0] for elem in raw(base_hand_model)])
+    fast_times = []
+    num_times = []
+    distances = []
+    for image_joints in hands:
+        lines_info, depth_info = extract_model_info(image_joints, cal)
+        tr, rotmat = get_best_first_transform(base_hand_model, lines_info, depth_info, side)
+        first_hand_model = hand_format([first_transform_point(rotmat, tr, p) for p in raw(base_hand_model)])
+        palm_base_axis = normalize(np.cross(first_hand_model[INDEX][0] - first_hand_model[WRIST][0],
+                                            first_hand_model[BABY][0] - first_hand_model[WRIST][0]))
+        for fin in (INDEX, MIDDLE, RING, BABY):
+            lengths = [np.linalg.norm(first_hand_model[fin][idx + 1] - first_hand_model[fin][idx])
+                       for idx in range(3)]
+
+            def fast():
+                return build_finger_fast(basejoint=first_hand_model[fin][0],
+                                         lengths=lengths,
+                                         jointversors=lines_info[fin][1:],
+                                         depthsugg=depth_info[fin][1:])[0]
+
+            def num():
+                return compute_generic_finger(first_hand_model=first_hand_model,
+                                              palm_base_axis=palm_base_axis,
+                                              lines_info=lines_info,
+                                              depth_sugg=depth_info,
+                                              finger=fin)
+
+            fast_times.append(timeit.timeit(fast, number=repeat) / repeat)
+            num_times.append(timeit.timeit(num, number=repeat) / repeat)
+            distances.append(np.average(np.linalg.norm(np.array(fast()) - np.array(num()), axis=1)))
+    return fast_times, num_times, distances
+
+
+# ################################ GEOMETRY BENCHMARK SUITE ################################
+# Reproducible benchmarks over synthetic hands: the base hand model is randomly rotated and moved
+# in front of the camera, then projected with noise. The true world joints are known,
+# so each benchmark reports both timings and accuracy.
+
+
+def timing_summary(times, errors=None):
+    """
+    Summarize the results of a benchmark
+    :param times: the list of call times in seconds
+    :param errors: the optional list of errors of each call, None where the call failed
+    :return: a dictionary of statistics, times in milliseconds
+    """
+    times = np.array(times) * 1e3
+    summary = {'calls': len(times),
+               'mean_ms': float(np.mean(times)),
+               'p50_ms': float(np.percentile(times, 50)),
+               'p95_ms': float(np.percentile(times, 95)),
+               'max_ms': float(np.max(times))}
+    if errors is not None:
+        valid = np.array([e for e in errors if e is not None and np.isfinite(e)])
+        summary['failures'] = len(errors) - len(valid)
+        summary['mean_error'] = float(np.mean(valid)) if len(valid) else float('nan')
+        summary['p50_error'] = float(np.percentile(valid, 50)) if len(valid) else float('nan')
+        summary['p95_error'] = float(np.percentile(valid, 95)) if len(valid) else float('nan')
+    return summary
+
+
+def hand_size(hand_model):
+    """
+    The distance of the farthest joint from the wrist
+    """
+    joints = np.array(raw(hand_model))
+    return np.max(np.linalg.norm(joints - joints[0], axis=1))
+
+
+def synthetic_hands(base_hand_model, count, cal=None, seed=0, pixel_noise=1.0,
+                    depth_noise=0.02, missing_depth=0.2, distance=4.0):
+    """
+    Generate hands by randomly rotating and moving the base model in front of the camera
+    :param base_hand_model: the hand model to use
+    :param count: the number of hands to generate
+    :param cal: the calibration of the camera
+    :param seed: the seed of the random generator
+    :param pixel_noise: the standard deviation in pixels of the noise added to the image joints
+    :param depth_noise: the standard deviation of the noise added to the measured depths, relative to the hand size
+    :param missing_depth: the probability of a joint having no depth measure
+    :param distance: the average distance of the hands from the camera, relative to the hand size
+    :return: a tuple of (count, 21, 3) true world joints and the list of image joints in hand format
+    """
+    if cal is None:
+        cal = current_calibration
+    rng = np.random.RandomState(seed)
+    joints = np.array(raw(base_hand_model), dtype=np.float64)
+    joints -= joints[0]
+    size = hand_size(base_hand_model)
+
+    worlds = []
+    hands = []
+    for _ in range(count):
+        rotation = get_rotation_matrix(rng.normal(size=3), rng.uniform(0, 2 * np.pi))
+        center = np.array([rng.uniform(-1, 1), rng.uniform(-0.5, 0.5), distance + rng.uniform(-1, 1)]) * size
+        world = joints @ rotation.T + center
+        image_points, depths = project(world, calibration=cal, makedepth=True)
+        image_points += rng.normal(scale=pixel_noise, size=image_points.shape)
+        depths += rng.normal(scale=depth_noise * size, size=depths.shape) * cal[DEPTHSCALE]
+        depths[rng.uniform(size=depths.shape) < missing_depth] = 0
+        worlds.append(world)
+        hands.append(hand_format([ImagePoint(c, depth=d) for c, d in zip(image_points, depths)]))
+    return np.array(worlds), hands
+
+
+def transforms_backends():
+    """
+    Load the available implementations of the transforms:
+        - numpy: library.geometry.transforms
+        - pythran: the compiled library.geometry.ptran.transforms, if it can be loaded
+        - numba: the sources of library.geometry.ptran.transforms compiled by numba, if it is installed
+    :return: a dictionary {backend name: module}
+    """
+    backends = {'numpy': numpy_transforms}
+    try:
+        from library.geometry.ptran import transforms as pythran_transforms
+        if os.path.splitext(pythran_transforms.__file__)[1] == '.so':
+            backends['pythran'] = pythran_transforms
+    except ImportError as e:
+        log("Pythran transforms not available: %s" % str(e), level=WARNINGS)
+    try:
+        from numba import njit
+        source = os.path.join(os.path.dirname(__file__), 'ptran', 'transforms.py')
+        spec = importlib.util.spec_from_file_location('numba_transforms', source)
+        numba_transforms = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(numba_transforms)
+        # jitted functions call each other through the module globals
+        for name, fun in list(vars(numba_transforms).items()):
+            if callable(fun) and getattr(fun, '__module__', None) == 'numba_transforms':
+                setattr(numba_transforms, name, njit(fun))
+        backends['numba'] = numba_transforms
+    except ImportError as e:
+        log("Numba transforms not available: %s" % str(e), level=WARNINGS)
+    return backends
+
+
+def transforms_benchmark(backends=None, repeat=1000, seed=0):
+    """
+    Compare the transforms backends on random vectors.
+    The error is the maximum absolute difference from the numpy backend.
+    :param backends: a dictionary {backend name: module}, by default all the available ones
+    :param repeat: the number of timed calls per function
+    :param seed: the seed of the random generator
+    :return: a dictionary {function name: {backend name: summary}}
+    """
+    if backends is None:
+        backends = transforms_backends()
+    rng = np.random.RandomState(seed)
+    args = {'get_rotation_matrix': [(normalize(rng.normal(size=3)), rng.uniform(0, np.pi)) for _ in range(repeat)],
+            'get_mapping_rot': [(rng.normal(size=3), rng.normal(size=3)) for _ in range(repeat)],
+            'get_rotation_angle_around_axis': [(normalize(rng.normal(size=3)), rng.normal(size=3),
+                                                rng.normal(size=3)) for _ in range(repeat)]}
+    results = {}
+    for name in TRANSFORMS_FUNCTIONS:
+        reference = [getattr(numpy_transforms, name)(*a) for a in args[name]]
+        results[name] = {}
+        for backend, module in backends.items():
+            fun = getattr(module, name)
+            # first call compiles the jitted backends
+            fun(*args[name][0])
+            times = [timeit.timeit(lambda: fun(*a), number=1) for a in args[name]]
+            errors = [float(np.max(np.abs(fun(*a) - r))) for a, r in zip(args[name], reference)]
+            results[name][backend] = timing_summary(times, errors)
+    return results
+
+
+def cone_sector_problems(count, seed=0, maxangle=np.pi / 3, wideangle=np.pi / 18, distance=600, radius=30):
+    """
+    Random cone sector problems having a solution that reaches the objective line:
+    a point on the sphere, inside the cone and on the plane of the cone axis and the tangent versor,
+    is taken as the objective line direction.
+    The line meets the sphere twice, so that point is not the only exact solution.
+    :return: a list of problem arguments
+    """
+    rng = np.random.RandomState(seed)
+    problems = []
+    for _ in range(count):
+        center = np.array([rng.uniform(-1, 1), rng.uniform(-1, 1), 0]) * distance / 4 + [0, 0, distance]
+        norm_vers = normalize(rng.normal(size=3))
+        tang_vers = normalize(np.cross(norm_vers, rng.normal(size=3)))
+        angle = rng.uniform(0, maxangle)
+        point = center + radius * (np.cos(angle) * norm_vers + np.sin(angle) * tang_vers)
+        problems.append((center, norm_vers, tang_vers, radius, np.cos(maxangle), np.cos(wideangle),
+                         normalize(point)))
+    return problems
+
+
+def cone_sector_residuals(sol, center, norm_vers, tang_vers, radius, normcos, planecos, objline, tolerance=1e-3):
+    """
+    How far a solution of a cone sector problem is from being exact.
+    :param sol: the point given by a solver
+    :param tolerance: the tolerance on the cosines of the cone membership check
+    :return: a tuple (residual, inside), where residual is the distance of the point from the objective line
+             plus its distance from the sphere, and inside is True if the point lies in the cone sector
+    """
+    rel = sol - center
+    residual = np.linalg.norm(np.cross(sol, objline)) + abs(np.linalg.norm(rel) - radius)
+    rel = normalize(rel)
+    # the angle from the cone axis and the angle from the plane of the axis and the tangent versor
+    ncos = np.dot(rel, norm_vers)
+    pcos2 = ncos ** 2 + np.dot(rel, tang_vers) ** 2
+    inside = ncos >= normcos - tolerance and pcos2 >= planecos ** 2 - tolerance
+    return float(residual), bool(inside)
+
+
+def cone_sectors_benchmark(count=200, seed=0):
+    """
+    Compare the cone sector solvers: the constrained one, its reduced (planar) version
+    and the boundary search, by brentq or by tables.
+    Every problem has an exact solution, errors are the residuals of cone_sector_residuals
+    and solutions out of the cone sector are counted apart as outside.
+    :return: a dictionary {solver name: summary}
+    """
+    solvers = {
+        'slsqp': lambda c, n, t, r, nc, pc, l: finger_cone_sectors.find_best_point_in_cone(c, n, t, r, nc, pc, l),
+        'reduced': lambda c, n, t, r, nc, pc, l: finger_cone_sectors_red.find_best_point_in_cone(c, n, t, r, nc, l),
+        'brentq': lambda c, n, t, r, nc, pc, l: finger_cone_sectors_opt.find_best_point_in_cone(c, n, t, r, nc, pc, l),
+        'table': lambda c, n, t, r, nc, pc, l: finger_cone_sectors_opt.find_best_point_in_cone(c, n, t, r, nc, pc, l,
+                                                                                              samples=32)
+    }
+    problems = cone_sector_problems(count, seed=seed)
+    results = {}
+    for name, solver in solvers.items():
+        times = []
+        errors = []
+        outside = 0
+        for args in problems:
+            start = timeit.default_timer()
+            try:
+                sol = solver(*args)
+            except Exception:
+                sol = None
+            times.append(timeit.default_timer() - start)
+            if sol is None:
+                errors.append(None)
+                continue
+            residual, inside = cone_sector_residuals(sol, *args)
+            errors.append(residual)
+            outside += 0 if inside else 1
+        results[name] = timing_summary(times, errors)
+        results[name]['outside'] = outside
+    return results
+
+
+def palm_benchmark(base_hand_model, worlds, hands, cal=None):
+    """
+    Compare the random restarts palm inference with the deterministic PalmSolver on synthetic hands.
+    The error is the largest distance of the palm points from the true ones, for the best of the pair.
+    :return: a dictionary {solver name: summary}
+    """
+    if cal is None:
+        cal = current_calibration
+    joints = np.array(raw(base_hand_model))
+    basepts = np.array([joints[0], joints[5], joints[17]])
+    solvers = {'random_restarts': get_points_projection_to_lines_pair,
+               'palm_solver': PalmSolver(warm_start=False).solve_pair}
+    results = {}
+    for name, solver in solvers.items():
+        times = []
+        errors = []
+        for world, hand in zip(worlds, hands):
+            lines_info, _ = extract_model_info(hand, cal)
+            lines = np.array([lines_info[WRIST][0], lines_info[INDEX][0], lines_info[BABY][0]])
+            truth = np.array([world[0], world[5], world[17]])
+            start = timeit.default_timer()
+            pair = solver(basepts, lines)
+            times.append(timeit.default_timer() - start)
+            errors.append(min(float(np.max(np.linalg.norm(p - truth, axis=1))) for p in pair))
+        results[name] = timing_summary(times, errors)
+    return results
+
+
+def full_localization_benchmark(base_hand_model, worlds, hands, cal=None):
+    """
+    Time the whole compute_hand_world_joints on synthetic hands, with both palm solvers.
+    The error is the mean joint distance from the true hand, relative to the hand size.
+    :return: a dictionary {configuration name: summary}
+    """
+    size = hand_size(base_hand_model)
+    configurations = {'random_restarts': lambda: None,
+                      'palm_solver': lambda: PalmSolver(warm_start=False)}
+    results = {}
+    for name, palm_solver in configurations.items():
+        times = []
+        errors = []
+        solver = palm_solver()
+        for world, hand in zip(worlds, hands):
+            start = timeit.default_timer()
+            try:
+                model = np.array(raw(compute_hand_world_joints(base_hand_model, hand, cal=cal, palm_solver=solver)))
+                errors.append(float(np.mean(np.linalg.norm(model - world, axis=1)) / size))
+            except Exception:
+                errors.append(None)
+            times.append(timeit.default_timer() - start)
+        results[name] = timing_summary(times, errors)
+    return results
+
+
+def geometry_benchmarks(base_hand_model, count=50, cal=None, seed=0, path=None, **hand_options):
+    """
+    Run the whole geometry benchmark suite
+    :param base_hand_model: the hand model used to generate the synthetic hands (ex: build_default_hand_model())
+    :param count: the number of synthetic hands
+    :param cal: the camera calibration, ZR300 by default
+    :param seed: the seed for all the random generations
+    :param path: if given, the results are also saved as json to this file to compare runs
+    :param hand_options: other options of synthetic_hands (ex: pixel_noise)
+    :return: a dictionary {benchmark name: results}
+    """
+    if cal is None:
+        cal = ZR300_CAL
+    # the random restarts solvers use the global generator
+    np.random.seed(seed)
+    worlds, hands = synthetic_hands(base_hand_model, count, cal=cal, seed=seed, **hand_options)
+    fast_times, num_times, distances = finger_search_benchmark(base_hand_model, hands, cal=cal, repeat=1)
+    results = {'transforms': transforms_benchmark(seed=seed),
+               'cone_sectors': cone_sectors_benchmark(seed=seed),
+               'fingers': {'fast': timing_summary(fast_times, distances),
+                           'numerical': timing_summary(num_times)},
+               'palm': palm_benchmark(base_hand_model, worlds, hands, cal=cal),
+               'hand_localization': full_localization_benchmark(base_hand_model, worlds, hands, cal=cal)}
+    if path is not None:
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+def format_benchmarks(results):
+    """
+    Format the results of geometry_benchmarks as a table
+    """
+    lines = []
+    for benchmark, entries in results.items():
+        lines.append("------------------------------------- %s" % benchmark)
+        # transforms results are nested by function
+        if all(isinstance(v, dict) and 'calls' not in v for v in entries.values()):
+            entries = {"%s/%s" % (fun, backend): summary
+                       for fun, backends in entries.items() for backend, summary in backends.items()}
+        for name, summary in entries.items():
+            line = "%-45s mean %8.3f ms | p95 %8.3f ms | max %8.3f ms" % \
+                   (name, summary['mean_ms'], summary['p95_ms'], summary['max_ms'])
+            if 'mean_error' in summary:
+                line += " | error mean %.3g p95 %.3g | failures %d" % \
+                        (summary['mean_error'], summary['p95_error'], summary['failures'])
+            lines.append(line)
+    return "\n".join(lines)
+
+
 if __name__ == '__main__':
     tms, gtms = projections_benchmark(100)
     print("-------------------------------------")
@@ -61,3 +430,21 @@ if __name__ == '__main__':
     print("Minimum call execution time: %f" % np.min(gtms))
     print("Call execution time variance: %f" % np.var(gtms))
     print("Total calls: %d" % len(gtms))
+
+    import data.datasets.io.hand_io as hio
+    import library.geometry.label_depth_mesh as ldm
+    from library.geometry.hand_prototype.build_prototype import extract_prototype
+    proto_data = hio.load("calibration_test.mat", format=(hio.LABEL_DATA, hio.DEPTH_DATA))
+    proto_model = extract_prototype(imagepts=ldm.extract_imgpoints(*proto_data), cal=ZR300_CAL)
+    _, subj_lab, subj_depth = hio.load("calibration_apply_test.mat", format=hio.ALL_DATA)
+    ftms, ntms, dsts = finger_search_benchmark(proto_model,
+                                               [hand_format(ldm.extract_imgpoints(subj_lab, subj_depth))],
+                                               cal=ZR300_CAL)
+    print("-------------------------------------")
+    print("Finger search on recorded hands:")
+    print("Average fast search time: %f" % np.average(ftms))
+    print("Average numerical search time: %f" % np.average(ntms))
+    print("Average joint distance between the two: %f" % np.average(dsts))
+
+    from library.geometry.hand_prototype.default_model_loading import build_default_hand_model
+    print(format_benchmarks(geometry_benchmarks(build_default_hand_model())))
@@ -65,6 +65,69 @@ def contains_origin(polygon):
 def fast_compute_angle(p1, p2):
     return np.arcsin(p1[0]*p2[1] - p1[1]*p2[0])
 
+# #################### SCANLINE RASTERIZATION ####################
+
+
+@jit(nopython=True, cache=True)
+def fill_polygons(vertices, offsets, height, width):
+    """
+    Rasterize many polygons at once with a compiled scanline fill.
+    A pixel (row, col) is set if its integer coordinates are inside any polygon
+    by the non-zero winding rule, as fast_is_inside.
+    :param vertices: a (N, 2) float array of (row, col) vertices of all the polygons, one after the other
+    :param offsets: a (P + 1,) int array, polygon i has vertices[offsets[i]:offsets[i + 1]]
+    :param height: the number of rows of the mask
+    :param width: the number of columns of the mask
+    :return: the (height, width) boolean mask
+    """
+    mask = np.zeros((height, width), dtype=np.bool_)
+    for p in range(len(offsets) - 1):
+        start = offsets[p]
+        n = offsets[p + 1] - start
+        if n < 3:
+            continue
+        poly = vertices[start:start + n]
+        low = max(int(np.ceil(np.min(poly[:, 0]))), 0)
+        high = min(int(np.floor(np.max(poly[:, 0]))), height - 1)
+        crossings = np.empty(n, dtype=np.float64)
+        windings = np.empty(n, dtype=np.int64)
+        for row in range(low, high + 1):
+            # crossings of the row with the edges, half-open on the rows to count vertices once
+            count = 0
+            for e in range(n):
+                r0 = poly[e, 0]
+                c0 = poly[e, 1]
+                r1 = poly[(e + 1) % n, 0]
+                c1 = poly[(e + 1) % n, 1]
+                if (r0 <= row < r1) or (r1 <= row < r0):
+                    crossings[count] = c0 + (row - r0) * (c1 - c0) / (r1 - r0)
+                    windings[count] = 1 if r1 > r0 else -1
+                    count += 1
+            order = np.argsort(crossings[:count])
+            winding = 0
+            for k in range(count - 1):
+                winding += windings[order[k]]
+                if winding != 0:
+                    left = max(int(np.ceil(crossings[order[k]])), 0)
+                    right = min(int(np.floor(crossings[order[k + 1]])), width - 1)
+                    for col in range(left, right + 1):
+                        mask[row, col] = True
+    return mask
+
+
+def rasterize_polygons(polygons, shape):
+    """
+    Rasterize a list of polygons in a single mask
+    :param polygons: a list of (N, 2) arrays of (row, col) vertices. Polygons with less than 3 vertices are skipped
+    :param shape: the (height, width) of the mask
+    :return: the boolean mask, True inside any polygon
+    """
+    polygons = [np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in polygons]
+    offsets = np.cumsum([0] + [len(p) for p in polygons]).astype(np.int64)
+    vertices = np.concatenate(polygons) if len(polygons) > 0 else np.zeros(shape=(0, 2))
+    return fill_polygons(vertices, offsets, int(shape[0]), int(shape[1]))
+
+
 # #################### TEST UTILS ##########################
 
 
@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from threading import Thread, Condition
+
+import numpy as np
+from PIL import Image
+
+
+def frame_to_image(frame):
+    """
+    Convert a video frame to an RGB PIL image.
+    :param frame: a (H, W, 3) array, floats in [0, 1] or integers
+    :return: the PIL image
+    """
+    frame = np.asarray(frame)
+    if frame.dtype in [np.float16, np.float32, np.float64]:
+        frame = frame * 255
+    return Image.fromarray(np.ascontiguousarray(frame.astype(np.uint8)), mode="RGB")
+
+
+class FrameWindow:
+    """
+    Sliding window of decoded frames around the playhead of a video.
+    A background thread converts the frames near the playhead (the ones ahead first),
+    while the ones out of the window are dropped, so that memory does not depend on
+    the video length and playback can start before the whole video is converted.
+    Frames are only read when needed, so frames can be any sequence (ex: a lazy video).
+    """
+    def __init__(self, frames, ahead=48, behind=16):
+        """
+        :param frames: a sequence of (H, W, 3) frames, supporting len and integer indexing
+        :param ahead: the number of frames prepared after the playhead, in the playback direction
+        :param behind: the number of frames kept before the playhead
+        """
+        self.frames = frames
+        self.ahead = ahead
+        self.behind = behind
+        self.cache = OrderedDict()
+        self.playhead = 0
+        self.direction = 1
+        self.stopped = False
+        self.condition = Condition()
+        self.hits = 0
+        self.misses = 0
+        Thread(target=self.prepare_loop, daemon=True).start()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def window(self):
+        """
+        :return: the frame numbers of the window, in preparation order
+        """
+        count = len(self.frames)
+        ahead = [(self.playhead + self.direction * i) % count for i in range(min(self.ahead + 1, count))]
+        behind = [(self.playhead - self.direction * i) % count for i in range(1, min(self.behind + 1, count))]
+        return ahead + behind
+
+    def seek(self, frameno, direction=None):
+        """
+        Move the playhead, frames around it will be prepared in background.
+        :param frameno: the new playhead frame
+        :param direction: 1 if playing forward, -1 backward, None to keep the current one
+        """
+        with self.condition:
+            self.playhead = frameno % len(self.frames)
+            if direction is not None:
+                self.direction = 1 if direction >= 0 else -1
+            self.condition.notify()
+
+    def get(self, frameno):
+        """
+        :param frameno: the frame number
+        :return: the PIL image of the frame, converted now if not prepared yet
+        """
+        frameno %= len(self.frames)
+        with self.condition:
+            image = self.cache.get(frameno)
+            if image is not None:
+                self.hits += 1
+                return image
+            self.misses += 1
+        image = frame_to_image(self.frames[frameno])
+        with self.condition:
+            self.cache[frameno] = image
+        return image
+
+    def __next_missing(self):
+        window = self.window()
+        # drop the frames out of the window
+        keep = set(window)
+        for frameno in [f for f in self.cache if f not in keep]:
+            del self.cache[frameno]
+        for frameno in window:
+            if frameno not in self.cache:
+                return frameno
+        return None
+
+    def prepare_loop(self):
+        while True:
+            with self.condition:
+                frameno = self.__next_missing()
+                while frameno is None and not self.stopped:
+                    self.condition.wait()
+                    frameno = self.__next_missing()
+                if self.stopped:
+                    return
+            image = frame_to_image(self.frames[frameno])
+            with self.condition:
+                self.cache[frameno] = image
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
@@ -285,10 +285,10 @@ if __name__ == '__main__':
         resolution = helper_hand_img.shape[0:2]
         camera_calib = calibration(intr=synth_intrinsic(resolution, (50, 50)))
         # Here we arbitrarily set their depth to make the constellation effect
-        flat_3d = [ImagePoint((elem[0] * resolution[0], elem[1] * resolution[1]), depth=10 + np.random.random())
-                       .to_camera_model(calibration=camera_calib)
-                       .as_row()
-                   for elem in label_data]
+        label_data = np.array(label_data)[:, 0:2]
+        flat_3d = unproject(label_data * resolution,
+                            depths=10 + np.random.random(size=len(label_data)),
+                            calibration=camera_calib)
         # compute the center of the constellation
         center = np.average(flat_3d, axis=0)
         # compute the rotation matrix
@@ -296,14 +296,11 @@ if __name__ == '__main__':
 
         while True:
             # rotate the 3D dataset
-            flat_3d = [np.matmul(rotation, elem - center) + center for elem in flat_3d]
+            flat_3d = (flat_3d - center) @ rotation.T + center
             # project it into image space
-            flat_2d = [ModelPoint(elem)
-                           .to_image_space(calibration=camera_calib)
-                           .as_row()
-                       for elem in flat_3d]
+            flat_2d = project(flat_3d, calibration=camera_calib)
             # normalize it before feeding to the model drawer
-            flat_2d_norm = [(x / resolution[0], y / resolution[1]) for (x, y) in flat_2d]
+            flat_2d_norm = flat_2d / resolution
             # feed to model drawer
             md.set_joints(hand_format(flat_2d_norm))
             time.sleep(0.04)
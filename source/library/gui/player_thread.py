@@ -4,15 +4,18 @@ from random import randint
 from tkinter import *
 
 import numpy as np
-from PIL import ImageTk, Image
+from PIL import ImageTk
 
 from data.datasets.framedata_management.naming import framebase
 from data.datasets.framedata_management.video_loader import linear_fill
+from library.gui.frame_window import FrameWindow
 
 
 class PlayerThread:
     """
-    Thread used to print video frames and corresponding labels
+    Thread used to print video frames and corresponding labels.
+    Frames are converted to images by a FrameWindow around the current frame,
+    so frames can also be a lazily loaded video.
     """
 
     def __init__(self, frames, canvas, status, indexes, discard, modeldrawer=None, labels=None, fps=30):
@@ -28,26 +31,19 @@ class PlayerThread:
         self.label_target_no = 0
         self.label_target_original = None
         self.label_target_initial_click = None
-        self.pic_height = np.shape(frames)[1]
-        self.pic_width = np.shape(frames)[2]
+        self.pic_height = np.shape(frames[0])[0]
+        self.pic_width = np.shape(frames[0])[1]
         self.play_flag = False
         self.frame_status_msg = status
         self.indexes = np.array([True if idx == 1 else False for idx in indexes]) if indexes is not None else None
         self.discard = discard
-        # Build the frame buffer at once
-        if frames[0].dtype in [np.float16, np.float32, np.float64]:
-            framebuff = np.array(frames * 255, dtype=np.int8)
-        elif frames[0].dtype.itemsize != 1:
-            framebuff = np.array(frames, dtype=np.int8)
-        else:
-            framebuff = frames
-
-        # keep track of image and photoimage, otherwise they get garbage-collected
-        self.imgs = [Image.fromarray(buffer, mode="RGB") for buffer in framebuff]
-        self.photoimgs = [ImageTk.PhotoImage(image=img) for img in self.imgs]
+        # frames are converted in background around the current one
+        self.window = FrameWindow(frames)
+        self.frame_count = len(frames)
 
         # frame counter
         self.current_frame = 0
+        self.window.seek(self.current_frame, direction=1)
         self.frameslider = None
 
         # persistent image canvas ID to be able to update it
@@ -56,19 +52,20 @@ class PlayerThread:
         if self.labels is not None and self.model_drawer is not None:
             self.model_drawer.set_joints(self.labels[self.current_frame])
 
-        self.deleted = np.array([False for _ in range(len(framebuff))])
-        self.edited = np.array([False for _ in range(len(framebuff))])
+        self.deleted = np.array([False for _ in range(self.frame_count)])
+        self.edited = np.array([False for _ in range(self.frame_count)])
 
         self.discard.set("Discarded" if self.deleted[self.current_frame] else "")
         if self.indexes is not None:
             self.frame_status_msg.set(self.update_frame_status(self.indexes[self.current_frame]))
 
-    def make_photoimage(self, buffer):
+    def make_photoimage(self, frameno):
         """
-        Produce a new photoimage from the given buffer.
-        :param buffer: the array buffer describing the image
+        Produce the photoimage of a frame. Photoimages must be built in the tkinter thread,
+        a reference is kept as otherwise they get garbage-collected.
+        :param frameno: the frame number
         """
-        self.current_img = Image.fromarray(buffer, mode="RGB")
+        self.current_img = self.window.get(frameno)
         self.current_photoimg = ImageTk.PhotoImage(image=self.current_img)
         return self.current_photoimg
 
@@ -79,14 +76,14 @@ class PlayerThread:
         :return: the ID of the created canvas
         """
         return self.canvas.create_image(0, 0, anchor=NW,
-                                        image=self.photoimgs[self.current_frame])
+                                        image=self.make_photoimage(self.current_frame))
 
     def update_frame(self):
         """
         Update the photoimage reference of the canvas image object,
         if any label has been given, update them as well
         """
-        self.canvas.itemconfig(self.imageid, image=self.photoimgs[self.current_frame])
+        self.canvas.itemconfig(self.imageid, image=self.make_photoimage(self.current_frame))
         if self.labels is not None and self.model_drawer is not None:
             self.model_drawer.set_joints(self.labels[self.current_frame])
 
@@ -112,8 +109,10 @@ class PlayerThread:
         start = time.time()
         if self.play_flag:
             # update the frame counter
-            self.current_frame += 1 if self.speed_mult > 0 else -1
-            self.current_frame %= len(self.photoimgs)
+            direction = 1 if self.speed_mult > 0 else -1
+            self.current_frame += direction
+            self.current_frame %= self.frame_count
+            self.window.seek(self.current_frame, direction=direction)
             # display the current photoimage
             self.update_frame()
         tot = (time.time()-start) * 1000
@@ -204,15 +203,16 @@ class PlayerThread:
         self.update_frame()
 
     def set_current_frame(self, frameno):
-        self.current_frame = frameno % len(self.imgs)
+        self.current_frame = frameno % self.frame_count
+        self.window.seek(self.current_frame)
         self.update_frame()
 
     def next_fixed_frame(self, jumps=1):
         if self.indexes is None:
             return
-        idx = (self.current_frame + jumps) % len(self.imgs)
+        idx = (self.current_frame + jumps) % self.frame_count
         while idx != self.current_frame and (self.deleted[idx] or not (self.indexes[idx] or self.edited[idx])):
-            idx = (idx + jumps) % len(self.imgs)
+            idx = (idx + jumps) % self.frame_count
         self.set_current_frame(idx)
 
     def reinterpolate(self):
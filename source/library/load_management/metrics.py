@@ -0,0 +1,208 @@
+import json
+import math
+from threading import Thread, Lock, Event
+from time import time
+
+from library.utils.logging import log, WARNINGS
+
+
+class Histogram:
+    """
+    Fixed-memory histogram of durations with logarithmic buckets.
+    Recording is O(1) and cheap enough for the hot path,
+    percentiles are estimated with a relative error of about (growth - 1) / 2.
+    """
+    def __init__(self, min_value=1e-5, max_value=1e2, growth=1.1):
+        """
+        :param min_value: values below this fall all in the first bucket
+        :param max_value: values above this fall all in the last bucket
+        :param growth: ratio between the bounds of consecutive buckets
+        """
+        self.min_value = min_value
+        self.log_growth = math.log(growth)
+        self.buckets = [0] * (int(math.ceil(math.log(max_value / min_value) / self.log_growth)) + 2)
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.lock = Lock()
+
+    def record(self, value):
+        if value <= self.min_value:
+            idx = 0
+        else:
+            idx = min(int(math.log(value / self.min_value) / self.log_growth) + 1, len(self.buckets) - 1)
+        with self.lock:
+            self.buckets[idx] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def bucket_value(self, idx):
+        """
+        The representative value of a bucket (geometric center of its bounds)
+        """
+        if idx == 0:
+            return self.min_value
+        return self.min_value * math.exp((idx - 0.5) * self.log_growth)
+
+    def percentile(self, p):
+        """
+        Estimate a percentile of the recorded values
+        :param p: the percentile in [0, 100]
+        :return: the estimated value, 0 if nothing has been recorded
+        """
+        with self.lock:
+            if self.count == 0:
+                return 0.
+            target = p / 100 * self.count
+            cumulative = 0
+            for idx, c in enumerate(self.buckets):
+                cumulative += c
+                if cumulative >= target and c > 0:
+                    return min(self.bucket_value(idx), self.max)
+            return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.
+
+    def reset(self):
+        with self.lock:
+            self.buckets = [0] * len(self.buckets)
+            self.count = 0
+            self.total = 0.
+            self.max = 0.
+
+    def summary(self):
+        return {'count': self.count,
+                'mean': self.mean(),
+                'p50': self.percentile(50),
+                'p95': self.percentile(95),
+                'p99': self.percentile(99),
+                'max': self.max}
+
+
+class ModuleMetrics:
+    """
+    Runtime statistics of a ModuleScheduler and of the OperationalModule wrapping it:
+        - latency: execution time of each call of the module function
+        - input age: time between the input acquisition and the moment its output is available
+        - throughput: calls and outputs per second over the last report window
+        - queue depth: calls submitted to the workers but not completed yet
+        - exceptions: number of exceptions raised, by type (ex: NoOutputException)
+    """
+    def __init__(self, name='module'):
+        self.name = name
+        self.latency = Histogram()
+        self.input_age = Histogram()
+        self.submitted = 0
+        self.completed = 0
+        self.outputs = 0
+        self.exceptions = {}
+        self.window_start = time()
+        self.window_completed = 0
+        self.window_outputs = 0
+        self.lock = Lock()
+
+    def on_submit(self):
+        with self.lock:
+            self.submitted += 1
+
+    def on_complete(self, elapsed):
+        self.latency.record(elapsed)
+        with self.lock:
+            self.completed += 1
+
+    def on_output(self, age):
+        self.input_age.record(age)
+        with self.lock:
+            self.outputs += 1
+
+    def on_exception(self, exception):
+        name = type(exception).__name__
+        with self.lock:
+            self.exceptions[name] = self.exceptions.get(name, 0) + 1
+
+    @property
+    def queue_depth(self):
+        return self.submitted - self.completed
+
+    def report(self, reset=True):
+        """
+        Collect the current statistics.
+        :param reset: if True, histograms and throughput window are restarted after the report
+        :return: a dictionary of statistics
+        """
+        now = time()
+        with self.lock:
+            window = max(now - self.window_start, 1e-9)
+            report = {'name': self.name,
+                      'time': now,
+                      'latency': self.latency.summary(),
+                      'input_age': self.input_age.summary(),
+                      'calls_per_second': (self.completed - self.window_completed) / window,
+                      'outputs_per_second': (self.outputs - self.window_outputs) / window,
+                      'queue_depth': self.queue_depth,
+                      'exceptions': dict(self.exceptions)}
+            if reset:
+                self.window_start = now
+                self.window_completed = self.completed
+                self.window_outputs = self.outputs
+        if reset:
+            self.latency.reset()
+            self.input_age.reset()
+        return report
+
+    @staticmethod
+    def format(report):
+        """
+        Format a report as a single log line
+        """
+        lat = report['latency']
+        age = report['input_age']
+        exc = ", ".join("%s: %d" % kv for kv in sorted(report['exceptions'].items())) or "none"
+        return ("[%s] latency p50/p95/p99: %.1f/%.1f/%.1f ms | input age p50/p95/p99: %.1f/%.1f/%.1f ms | "
+                "%.2f calls/s, %.2f outputs/s | queue depth: %d | exceptions: %s" %
+                (report['name'],
+                 lat['p50'] * 1e3, lat['p95'] * 1e3, lat['p99'] * 1e3,
+                 age['p50'] * 1e3, age['p95'] * 1e3, age['p99'] * 1e3,
+                 report['calls_per_second'], report['outputs_per_second'],
+                 report['queue_depth'], exc))
+
+
+class MetricsReporter:
+    """
+    Periodically exports the statistics of a ModuleMetrics from a background thread,
+    either as a log line or appended as a json line to a local file.
+    """
+    def __init__(self, metrics: ModuleMetrics, period=5.0, path=None, level=WARNINGS):
+        """
+        :param metrics: the metrics to be reported
+        :param period: seconds between two reports
+        :param path: if given, reports are appended to this file as json lines instead of being logged
+        :param level: the logging level of the report lines
+        """
+        self.metrics = metrics
+        self.period = period
+        self.path = path
+        self.level = level
+        self.stopped = Event()
+
+    def report(self):
+        report = self.metrics.report()
+        if self.path is None:
+            log(ModuleMetrics.format(report), level=self.level)
+        else:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(report) + '\n')
+
+    def loop(self):
+        while not self.stopped.wait(self.period):
+            self.report()
+
+    def start(self):
+        Thread(target=self.loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
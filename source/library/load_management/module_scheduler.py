@@ -2,12 +2,14 @@ from concurrent.futures import Executor
 from threading import Thread, Condition, RLock
 from time import time, sleep
 import random
+from library.load_management.metrics import ModuleMetrics
 
 
 class ModuleScheduler:
     def __init__(self, func: callable, workers: Executor, max_overlaps: int,
                  input_producer: callable, output_consumer: callable,
-                 target_frequency: float):
+                 target_frequency: float, metrics: ModuleMetrics=None):
+        self.metrics = metrics or ModuleMetrics()
         self.workers = workers
         self.max_overlaps = max_overlaps
         self.input_producer = input_producer
@@ -39,7 +41,13 @@ class ModuleScheduler:
 
     def timed_run(self):
         tstart = time()
-        self.run_func(target_time=tstart)
+        try:
+            self.run_func(target_time=tstart)
+        except Exception as e:
+            self.metrics.on_exception(e)
+            raise
+        finally:
+            self.metrics.on_complete(time() - tstart)
         elapsed_time = time() - tstart
         with self.exec_time_lock:
             avg_coeff = 2 / (self.num_calls + 2)
@@ -59,6 +67,7 @@ class ModuleScheduler:
                 if self.avg_exec_time / (period * (1+self.movement)) > self.max_overlaps:
                     period = 1.05 * self.avg_exec_time / self.max_overlaps
                     self.frequency = 1 / (period * (1+self.movement))
+                self.metrics.on_submit()
                 self.workers.submit(fn=self.timed_run)
                 sleep(period)
                 if random.random() < self.movement:
@@ -1,6 +1,8 @@
 from library.load_management.module_scheduler import ModuleScheduler
 from library.load_management.frequency_decouple import Interpolator
+from library.load_management.metrics import ModuleMetrics, MetricsReporter
 from concurrent.futures import ThreadPoolExecutor
+from time import time as now
 
 
 class NoOutputException(Exception):
@@ -12,8 +14,10 @@ class OperationalModule:
     def __init__(self, func: callable, workers: int,
                  input_source: callable, output_adapter: callable,
                  working_frequency: float,
-                 interp_order=0, interp_samples=1):
+                 interp_order=0, interp_samples=1, name='module'):
 
+        self.metrics = ModuleMetrics(name=name)
+        self.reporter = None
         self.interpolator = Interpolator(order=interp_order, samples=interp_samples)
         self.executor_pool = ThreadPoolExecutor(max_workers=workers)
         self.output_adapter = output_adapter
@@ -23,13 +27,25 @@ class OperationalModule:
                                          max_overlaps=workers,
                                          input_producer=input_source,
                                          output_consumer=self.feed_to_interpolator,
-                                         target_frequency=working_frequency)
+                                         target_frequency=working_frequency,
+                                         metrics=self.metrics)
 
     def feed_to_interpolator(self, time, input, output):
         try:
             self.interpolator[time] = self.output_adapter(input, output)
-        except NoOutputException:
-            pass
+            self.metrics.on_output(now() - time)
+        except NoOutputException as e:
+            self.metrics.on_exception(e)
+
+    def report_metrics(self, period=5.0, path=None):
+        """
+        Start exporting the module metrics periodically.
+        :param period: seconds between two reports
+        :param path: if given, reports are appended as json lines to this file, otherwise they are logged
+        """
+        if self.reporter is not None:
+            self.reporter.stop()
+        self.reporter = MetricsReporter(self.metrics, period=period, path=path).start()
 
     def __getitem__(self, item):
         return self.interpolator[item]
@@ -44,6 +60,8 @@ class OperationalModule:
         self.scheduler.stop()
 
     def shutdown(self):
+        if self.reporter is not None:
+            self.reporter.stop()
         self.scheduler.shutdown()
 
     @property
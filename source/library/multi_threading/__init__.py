@@ -1 +1,3 @@
-from library.multi_threading.thread_pool_manager import ThreadPoolManager
\ No newline at end of file
+from library.multi_threading.thread_pool_manager import ThreadPoolManager
+from library.multi_threading.process_pool_manager import ProcessPoolManager
+from library.multi_threading.prefetch import prefetched
@@ -0,0 +1,40 @@
+from queue import Queue
+from threading import Thread
+
+_END = object()
+
+
+class _Failure:
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def prefetched(iterable, depth=2):
+    """
+    Iterate over an iterable whose items are produced by a background thread,
+    so that producing the next items (ex: reading and preprocessing data from disk)
+    overlaps with the consumption of the current one (ex: network inference).
+    At most depth items are kept ready, so memory stays bounded.
+    Exceptions of the producer are raised in the consumer.
+    :param iterable: the iterable to be consumed
+    :param depth: the number of items produced in advance
+    :return: a generator over the items of iterable
+    """
+    queue = Queue(maxsize=depth)
+
+    def produce():
+        try:
+            for item in iterable:
+                queue.put(item)
+        except Exception as e:
+            queue.put(_Failure(e))
+        queue.put(_END)
+
+    Thread(target=produce, daemon=True).start()
+    while True:
+        item = queue.get()
+        if item is _END:
+            return
+        if isinstance(item, _Failure):
+            raise item.exception
+        yield item
@@ -0,0 +1,46 @@
+from concurrent.futures import ProcessPoolExecutor, wait
+from importlib import import_module
+import os
+
+# modules imported by the workers as soon as they start, so that the first tasks do not pay for it
+DEFAULT_PRELOAD = ('library.geometry.hand_localization.fingers',)
+
+
+def _preload(modules):
+    for module in modules:
+        import_module(module)
+
+
+def _ready():
+    return os.getpid()
+
+
+def prefork_pool(processes=None, preload=DEFAULT_PRELOAD):
+    """
+    Create a process pool whose workers are all started before returning.
+    Processes do not share the GIL, so CPU-bound python and scipy work
+    (ex: the finger reconstruction) really runs in parallel.
+    Tasks and results are pickled: they should be small arrays, and functions defined at module level.
+    :param processes: the number of worker processes, None for one per core
+    :param preload: the modules the workers import at start
+    :return: the ProcessPoolExecutor
+    """
+    processes = processes or os.cpu_count()
+    pool = ProcessPoolExecutor(max_workers=processes, initializer=_preload, initargs=(tuple(preload),))
+    wait([pool.submit(_ready) for _ in range(processes)])
+    return pool
+
+
+class ProcessPoolManager:
+    __process_pool = None
+
+    @staticmethod
+    def get_process_pool(processes=None):
+        ProcessPoolManager.__process_pool = ProcessPoolManager.__process_pool or prefork_pool(processes)
+        return ProcessPoolManager.__process_pool
+
+    @staticmethod
+    def shutdown():
+        if ProcessPoolManager.__process_pool is not None:
+            ProcessPoolManager.__process_pool.shutdown()
+            ProcessPoolManager.__process_pool = None
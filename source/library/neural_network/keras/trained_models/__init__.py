@@ -1,2 +1,2 @@
-from library.neural_network.keras.trained_models.heatmap import heatmap
+from library.neural_network.keras.trained_models.heatmap import heatmap, frozen_heatmap, HEATMAP_STRIDE
 from keras.applications.mobilenet import preprocess_input
@@ -0,0 +1,139 @@
+import json
+import os
+import timeit
+
+import keras.backend as kb
+import numpy as np
+import tensorflow as tf
+from tensorflow.tools.graph_transforms import TransformGraph
+
+# graph_transforms applied in this order to the frozen graph.
+# Batch-norm folding merges the normalization into the preceding convolution weights,
+# so that at inference time only Conv2D + BiasAdd are left.
+INFERENCE_TRANSFORMS = ['strip_unused_nodes',
+                        'remove_nodes(op=Identity, op=CheckNumerics)',
+                        'fold_constants(ignore_errors=true)',
+                        'fold_batch_norms',
+                        'fold_old_batch_norms',
+                        'merge_duplicate_nodes',
+                        'sort_by_execution_order']
+QUANTIZATION_TRANSFORMS = ['quantize_weights']
+
+
+def names_path(frozen_path):
+    """
+    The path of the file holding input/output tensor names of a frozen graph
+    :param frozen_path: the path of the frozen .pb graph
+    :return: the path of the sidecar names file
+    """
+    return os.path.splitext(frozen_path)[0] + '.json'
+
+
+def freeze_model(model_loader: callable, export_path, quantize=False):
+    """
+    Freeze a keras model into an inference-only tensorflow graph.
+    The session is cleared and set in inference mode before loading the model,
+    so that dropout and batch-norm training branches never enter the graph.
+    Variables are converted to constants, training nodes are stripped and batch-norms
+    are folded into the convolutions.
+    :param model_loader: a function with no arguments returning the keras model to freeze
+                         (ex: library.neural_network.heatmap)
+    :param export_path: the path of the .pb file to write. Tensor names are saved aside in a .json file
+    :param quantize: if True, weights are quantized to 8 bits after training (post-training quantization).
+                     This shrinks the file and may speed up CPU inference at a small accuracy cost.
+    :return: the path of the exported graph
+    """
+    kb.clear_session()
+    kb.set_learning_phase(0)
+    model = model_loader()
+    session = kb.get_session()
+
+    input_names = [t.op.name for t in model.inputs]
+    output_names = [t.op.name for t in model.outputs]
+
+    graph_def = session.graph.as_graph_def()
+    graph_def = tf.graph_util.convert_variables_to_constants(session, graph_def, output_names)
+    graph_def = tf.graph_util.remove_training_nodes(graph_def, protected_nodes=output_names)
+
+    transforms = list(INFERENCE_TRANSFORMS)
+    if quantize:
+        transforms += QUANTIZATION_TRANSFORMS
+    graph_def = TransformGraph(graph_def, input_names, output_names, transforms)
+
+    export_dir, export_name = os.path.split(export_path)
+    tf.train.write_graph(graph_def, export_dir, export_name, as_text=False)
+    with open(names_path(export_path), 'w') as f:
+        json.dump({'inputs': [t.name for t in model.inputs],
+                   'outputs': [t.name for t in model.outputs]}, f)
+
+    kb.clear_session()
+    return export_path
+
+
+class FrozenModel:
+    """
+    Inference-only model loaded from a graph exported with freeze_model.
+    Mimics the keras Model.predict interface so that it can be used in place of
+    the keras model in pipelines and evaluations.
+    Predictions are thread safe, so it can be fed to an OperationalModule.
+    """
+    def __init__(self, frozen_path, intra_op_threads=0, inter_op_threads=0):
+        """
+        :param frozen_path: the path of the .pb graph produced by freeze_model
+        :param intra_op_threads: threads used inside a single op. 0 lets tensorflow decide
+        :param inter_op_threads: threads used to run independent ops. 0 lets tensorflow decide
+        """
+        graph_def = tf.GraphDef()
+        with tf.gfile.GFile(frozen_path, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+        with open(names_path(frozen_path), 'r') as f:
+            names = json.load(f)
+
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.import_graph_def(graph_def, name='')
+        self.inputs = [self.graph.get_tensor_by_name(n) for n in names['inputs']]
+        self.outputs = [self.graph.get_tensor_by_name(n) for n in names['outputs']]
+
+        config = tf.ConfigProto(intra_op_parallelism_threads=intra_op_threads,
+                                inter_op_parallelism_threads=inter_op_threads)
+        self.session = tf.Session(graph=self.graph, config=config)
+
+    def predict(self, x, batch_size=None):
+        """
+        Run the frozen graph on the given inputs
+        :param x: the input batch, or a list of input batches for multi-input models
+        :param batch_size: if given, x is split in chunks of this size
+        :return: the output batch, or a list of output batches for multi-output models
+        """
+        if not isinstance(x, (list, tuple)):
+            x = [x]
+        length = len(x[0])
+        batch_size = batch_size or length
+        chunks = []
+        for start in range(0, length, batch_size):
+            feed = {t: v[start:start + batch_size] for t, v in zip(self.inputs, x)}
+            chunks.append(self.session.run(self.outputs, feed_dict=feed))
+        outs = [np.concatenate([c[i] for c in chunks], axis=0) for i in range(len(self.outputs))]
+        return outs[0] if len(outs) == 1 else outs
+
+    def close(self):
+        self.session.close()
+
+
+def inference_benchmark(models: dict, input_shape, repeat=100, batch_size=1):
+    """
+    Compare the per-call prediction time of several models on random inputs.
+    :param models: a dictionary {name: model}, each model must provide predict
+    :param input_shape: the shape of a single sample
+    :param repeat: the number of timed calls per model
+    :param batch_size: the number of samples passed to each call
+    :return: a dictionary {name: list of call times}
+    """
+    x = np.random.uniform(low=-1, high=1, size=(batch_size,) + tuple(input_shape)).astype(np.float32)
+    times = {}
+    for name, model in models.items():
+        # first call warms up allocations and lazy initializations
+        model.predict(x)
+        times[name] = [timeit.timeit(lambda: model.predict(x), number=1) for _ in range(repeat)]
+    return times
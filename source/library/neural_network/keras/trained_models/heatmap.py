@@ -6,6 +6,7 @@ sys.path.append(os.path.realpath(os.path.join(os.path.split(__file__)[0], "..",
 import keras.backend as kb
 
 from library.neural_network.keras.models.heatmap import *
+from library.neural_network.keras.trained_models.frozen import FrozenModel
 from data.naming import *
 from keras.applications.mobilenet import preprocess_input
 
@@ -15,8 +16,48 @@ def relu6(x):
 
 
 model_path = models_path('deployment', 'transfer_mobilenet.h5')
-
-
-def heatmap():
-    model = km.load_model(model_path, custom_objects={'relu6': relu6})
-    return model
+frozen_model_path = models_path('deployment', 'transfer_mobilenet_frozen.pb')
+quantized_model_path = models_path('deployment', 'transfer_mobilenet_quantized.pb')
+variable_frozen_model_path = models_path('deployment', 'transfer_mobilenet_variable_frozen.pb')
+# total stride of the heatmap model: a (H, W) input gives a (H / 4, W / 4) heatmap
+HEATMAP_STRIDE = 4
+
+
+def heatmap(variable_input=False):
+    """
+    Load the deployed heatmap model.
+    :param variable_input: if True, the model accepts inputs of any (height, width) multiple of HEATMAP_STRIDE.
+                           The model is fully convolutional, so it is rebuilt with free spatial
+                           dimensions and the trained weights (ex: to run it on regions of interest)
+    :return: the keras model
+    """
+    custom_objects = {'relu6': relu6}
+    model = km.load_model(model_path, custom_objects=custom_objects)
+    if not variable_input:
+        return model
+    config = model.get_config()
+    layers = config['layers'] if isinstance(config, dict) else config
+    # the input shape is held by the first layer (the InputLayer if the model was built with one)
+    first = next(layer for layer in layers if 'batch_input_shape' in layer['config'])
+    first['config']['batch_input_shape'] = [None, None, None, model.input_shape[-1]]
+    variable = km.Sequential.from_config(config, custom_objects=custom_objects)
+    variable.set_weights(model.get_weights())
+    return variable
+
+
+def frozen_heatmap(quantized=False, variable_input=False):
+    """
+    Load the inference-only export of the deployed heatmap model.
+    Falls back to the full keras model if it has not been exported yet
+    (see runnables/networks/trained/export_frozen_heatmap.py).
+    :param quantized: if True, load the export with 8 bits quantized weights
+    :param variable_input: if True, load the export accepting inputs of any size (see heatmap)
+    :return: a model exposing predict
+    """
+    if variable_input:
+        path = variable_frozen_model_path
+    else:
+        path = quantized_model_path if quantized else frozen_model_path
+    if not os.path.exists(path):
+        return heatmap(variable_input=variable_input)
+    return FrozenModel(path)
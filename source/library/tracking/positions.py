@@ -0,0 +1,87 @@
+import numpy as np
+from scipy import ndimage
+
+# post-processing parameters are tuned on heatmaps of this side,
+# and are rescaled for heatmaps of different resolution
+REFERENCE_SIZE = 56
+
+
+def disk(radius):
+    """
+    A boolean disk structuring element, as skimage.morphology.disk
+    :param radius: the radius of the disk in pixels
+    :return: a (2*radius+1, 2*radius+1) boolean array
+    """
+    coords = np.arange(-radius, radius + 1)
+    return coords[:, None] ** 2 + coords[None, :] ** 2 <= radius ** 2
+
+
+def extract_positions(heatmaps, threshold=0.15, closing_radius=5, min_area=20, reference_size=REFERENCE_SIZE):
+    """
+    Find the biggest blob in each of a stack of heatmaps, all at once.
+    This mirrors the per-frame pipeline closing -> clear_border -> label -> largest regionprops,
+    but labels the whole stack in one pass and computes only bounding box and centroid
+    of the largest component of each heatmap.
+    :param heatmaps: a (N, H, W) stack of heatmaps (or a single (H, W) heatmap)
+    :param threshold: the heat over which a pixel is considered part of a hand
+    :param closing_radius: the radius of the morphological closing at reference_size resolution
+    :param min_area: the minimum area of an accepted blob at reference_size resolution
+    :param reference_size: the heatmap side the other parameters refer to
+    :return: bboxes, centroids, valid
+             bboxes: (N, 2, 2) normalized boxes [[row_min, row_max], [col_min, col_max]]
+             centroids: (N, 2) normalized (row, col) centroids
+             valid: (N,) boolean array, False where no blob was found
+    """
+    heatmaps = np.asarray(heatmaps)
+    if heatmaps.ndim == 2:
+        heatmaps = heatmaps[None]
+    n, h, w = heatmaps.shape
+    scale = np.sqrt(h * w) / reference_size
+    radius = max(int(round(closing_radius * scale)), 1)
+    min_area = min_area * scale ** 2
+
+    bboxes = np.zeros(shape=(n, 2, 2), dtype=np.float32)
+    centroids = np.zeros(shape=(n, 2), dtype=np.float32)
+    valid = np.zeros(shape=(n,), dtype=np.bool_)
+
+    # closing applied independently on each frame: the structuring element is flat along the stack
+    structure = disk(radius)[None]
+    mask = ndimage.binary_dilation(heatmaps > threshold, structure=structure)
+    mask = ndimage.binary_erosion(mask, structure=structure, border_value=1)
+
+    # 8-connectivity inside each frame, no connection across frames
+    connectivity = np.zeros(shape=(3, 3, 3), dtype=np.bool_)
+    connectivity[1] = True
+    labels, count = ndimage.label(mask, structure=connectivity)
+    if count == 0:
+        return bboxes, centroids, valid
+
+    areas = np.bincount(labels.ravel(), minlength=count + 1).astype(np.float64)
+    # remove blobs connected to the image border
+    border = np.concatenate((labels[:, 0, :].ravel(), labels[:, -1, :].ravel(),
+                             labels[:, :, 0].ravel(), labels[:, :, -1].ravel()))
+    areas[np.unique(border)] = 0
+    areas[0] = 0
+
+    # the frame each label belongs to, then the largest label per frame
+    objects = ndimage.find_objects(labels)
+    ids = np.array([i + 1 for i, o in enumerate(objects) if o is not None and areas[i + 1] > 0])
+    if len(ids) == 0:
+        return bboxes, centroids, valid
+    frames = np.array([objects[i - 1][0].start for i in ids])
+    order = np.lexsort((areas[ids], frames))
+    last = np.append(frames[order][1:] != frames[order][:-1], True)
+    best = ids[order][last]
+    best = best[areas[best] >= min_area]
+
+    shape = np.array([h, w], dtype=np.float32)
+    rows = np.arange(h)[None, :, None]
+    cols = np.arange(w)[None, None, :]
+    sums_r = ndimage.sum(np.broadcast_to(rows, labels.shape), labels, index=best)
+    sums_c = ndimage.sum(np.broadcast_to(cols, labels.shape), labels, index=best)
+    for k, lab in enumerate(best):
+        fr, rs, cs = objects[lab - 1]
+        bboxes[fr.start] = np.array([[rs.start, rs.stop], [cs.start, cs.stop]]) / shape[:, None]
+        centroids[fr.start] = np.array([sums_r[k], sums_c[k]]) / areas[lab] / shape
+        valid[fr.start] = True
+    return bboxes, centroids, valid
@@ -0,0 +1,115 @@
+import numpy as np
+from threading import RLock
+
+# all boxes are in normalized frame coordinates, as [[row_min, row_max], [col_min, col_max]]
+# (the same convention of the bounding boxes produced by extract_position)
+FULL_FRAME = np.array([[0., 1.], [0., 1.]])
+
+
+def crop(frame, roi):
+    """
+    Cut the region of interest out of a frame, snapping it to the pixel grid.
+    :param frame: the frame to be cropped, with shape (height, width, ...)
+    :param roi: the normalized region of interest
+    :return: the crop and the normalized roi actually cut (to be used when mapping back results)
+    """
+    shape = np.array(frame.shape[:2])
+    start = np.floor(roi[:, 0] * shape).astype(np.int32)
+    end = np.maximum(np.ceil(roi[:, 1] * shape).astype(np.int32), start + 1)
+    exact = np.stack((start, end), axis=1) / shape[:, None]
+    return frame[start[0]:end[0], start[1]:end[1]], exact
+
+
+def roi_input_shape(roi, full_input_shape=(224, 224), stride=4, min_side=32):
+    """
+    The input shape of a fully convolutional detector for a region of interest.
+    The roi keeps the scale the whole frame has when resized to full_input_shape,
+    so that the hand looks as in full frame detections and the cost of the net shrinks with the roi area.
+    :param roi: the normalized region of interest
+    :param full_input_shape: the (height, width) input of the detector for the whole frame
+    :param stride: the total stride of the detector, sides are rounded up to a multiple of it
+    :param min_side: the minimum side of the input
+    :return: the (height, width) input shape
+    """
+    full_input_shape = np.array(full_input_shape)
+    sides = np.ceil((roi[:, 1] - roi[:, 0]) * full_input_shape / stride) * stride
+    return tuple(int(s) for s in np.clip(sides, a_min=min_side, a_max=full_input_shape))
+
+
+class RoiTracker:
+    """
+    Predicts where the hand will be in the next frame from the previous detections,
+    so that the detector can run only on a crop of the frame around it.
+    Full frame detection is performed when no hand is being tracked, when the hand is lost
+    inside the predicted region and every redetect_period frames to catch new hands.
+    This is thread safe, so it can be used by concurrent workers of an OperationalModule.
+    """
+    def __init__(self, redetect_period=30, margin=0.5, min_size=0.25, velocity_smoothing=0.5):
+        """
+        :param redetect_period: maximum number of consecutive roi-only frames before a full frame detection
+        :param margin: how much the last box is enlarged (relative to its size) to build the roi
+        :param min_size: minimum normalized size of each side of the roi
+        :param velocity_smoothing: weight of the old velocity estimate when a new detection arrives
+        """
+        self.redetect_period = redetect_period
+        self.margin = margin
+        self.min_size = min_size
+        self.velocity_smoothing = velocity_smoothing
+        self.last_box = None
+        self.last_time = None
+        self.velocity = np.zeros(shape=(2, 1))
+        self.since_detection = 0
+        self.lock = RLock()
+
+    def next_roi(self, time=None):
+        """
+        Predict the region where the detector should run next.
+        :param time: the time the frame was taken, used to extrapolate the hand movement
+        :return: the normalized roi, FULL_FRAME if a full detection is needed
+        """
+        with self.lock:
+            if self.last_box is None or self.since_detection >= self.redetect_period:
+                self.since_detection = 0
+                return FULL_FRAME.copy()
+            self.since_detection += 1
+            box = self.last_box
+            if time is not None and self.last_time is not None:
+                box = box + self.velocity * max(time - self.last_time, 0)
+        center = np.mean(box, axis=1, keepdims=True)
+        half = np.maximum((box[:, 1:] - box[:, :1]) * (1 + self.margin), self.min_size) / 2
+        roi = np.concatenate((center - half, center + half), axis=1)
+        return np.clip(roi, a_min=0, a_max=1)
+
+    def update(self, roi, box, time=None):
+        """
+        Register a detection made inside a roi.
+        :param roi: the normalized roi the detector was run on
+        :param box: the detected box, normalized with respect to the roi
+        :param time: the time the frame was taken
+        :return: the detected box in normalized frame coordinates
+        """
+        box = roi[:, :1] + np.asarray(box) * (roi[:, 1:] - roi[:, :1])
+        with self.lock:
+            # results of concurrent workers may arrive out of order
+            if time is not None and self.last_time is not None:
+                if time <= self.last_time:
+                    return box
+                if self.last_box is not None:
+                    move = (np.mean(box, axis=1, keepdims=True) -
+                            np.mean(self.last_box, axis=1, keepdims=True)) / (time - self.last_time)
+                    self.velocity = self.velocity * self.velocity_smoothing + move * (1 - self.velocity_smoothing)
+            self.last_box = box
+            self.last_time = time
+        return box
+
+    def lost(self, time=None):
+        """
+        Register a failed detection: the next frame will be fully searched.
+        :param time: the time the frame was taken
+        """
+        with self.lock:
+            if time is not None and self.last_time is not None and time <= self.last_time:
+                return
+            self.last_box = None
+            self.last_time = time
+            self.velocity = np.zeros(shape=(2, 1))
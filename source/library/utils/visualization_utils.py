@@ -1,8 +1,10 @@
+from functools import lru_cache
+
 import numpy as np
 from skimage.transform import resize
 from data import *
 from data.datasets.crop.utils import get_crops_from_heatmap
-from data.datasets.jlocator.heatmaps_to_hand import heatmaps_to_hand
+from data.datasets.jlocator.heatmaps_to_hand import heatmaps_to_hands
 from library.geometry.formatting import *
 from skimage.draw import *
 
@@ -154,101 +156,133 @@ def crop_sprite(feed, sprite_shape=(300, 300, 3), img_key=IN(0), heat_key=NET_OU
     return ret
 
 
+def normalized_batch(images):
+    """
+    :param images: a batch of images
+    :return: the images with values scaled to [0, 1], image by image
+    """
+    images = np.asarray(images)
+    axes = tuple(range(1, images.ndim))
+    im_min = np.min(images, axis=axes, keepdims=True)
+    im_max = np.max(images, axis=axes, keepdims=True)
+    return (images - im_min) / (im_max - im_min)
+
+
 def get_image_with_mask(image, mask, k=0.15):
     """
     Given an image or a batch of images, and the same number
     of heat maps, this function return the images with the
     mask in transparency depending on the value of k as follows
     result = (k + ((1-k) * mask)) * image
+    A batch is computed at once, masks are resized together if needed.
     :param image: is the batch of images
     :param mask: is the heatmap to apply
     :param k: is the transparency of the heatmap w.r.t. to the image
     :return: a batch of images or a single image
     """
-    if len(np.shape(image)) == 4:
-        images = []
-
-        for i in range(len(image)):
-            tmp_mask = mask[i]
-            im_min = np.min(image[i])
-            im_max = np.max(image[i])
-            if np.shape(image[i])[:-1] != np.shape(mask[i])[:-1]:
-                tmp_mask = resize(mask[i], output_shape=np.shape(image[i])[:-1])
-            images.append(255*(k + (1 - k) * tmp_mask) * (image[i] - im_min) / (im_max-im_min))
-        return np.array(images)
-
-    im_min = np.min(image)
-    im_max = np.max(image)
-    if np.shape(image)[:-1] != np.shape(mask)[:-1]:
+    if len(np.shape(image)) != 4:
+        return get_image_with_mask(np.asarray(image)[None], np.asarray(mask)[None], k=k)[0]
+    mask = np.asarray(mask)
+    if np.shape(image)[1:-1] != np.shape(mask)[1:-1]:
         mask = resize(mask, output_shape=np.shape(image)[:-1])
-    return 255*(k + ((1 - k) * mask)) * (image - im_min) / (im_max-im_min)
+    return 255*(k + (1 - k) * mask) * normalized_batch(image)
 
 
-@batch_tb_logging
 def finger_field_impression(feed, img_key=IN(0),
                             field_key=NET_OUT('field')):
-    img = feed[img_key]
-    imgmin = np.min(img)
-    imgmax = np.max(img)
-    img = (img - imgmin) / (imgmax - imgmin)
-    fields = feed[field_key]
+    img = normalized_batch(feed[img_key])
+    fields = np.asarray(feed[field_key])
 
-    f_repr = np.sum([fields[:, :, 2*i:2*i+2] for i in range(fields.shape[-1]//2)], axis=0)
-    f_repr = np.concatenate([f_repr, np.zeros(shape=f_repr.shape[:-1]+(1,))], axis=2)
+    f_repr = np.sum([fields[..., 2*i:2*i+2] for i in range(fields.shape[-1]//2)], axis=0)
+    f_repr = np.concatenate([f_repr, np.zeros(shape=f_repr.shape[:-1]+(1,))], axis=-1)
     # f_repr[f_repr != 0] += 1.0
     # f_repr /= 2
 
     return img+resize(f_repr, output_shape=img.shape)
 
 
-def produce_skeleton_image(img, hand):
-    out = np.array(img)
-    outshape = np.shape(out)
+# bones in drawing order, as (joint, previous joint, color), each joint is drawn after its bones
+BONES = [(idx, idx2, col) for idx in SEGMENTS_LIST for (idx2, col) in SEGMENTS_LIST[idx]]
+# pixels of a joint dot of radius 2 around its center
+DOT_OFFSETS = np.array([(r, c) for r in range(-2, 3) for c in range(-2, 3) if r*r + c*c < 4])
+
+
+@lru_cache(maxsize=1 << 16)
+def line_pixels(r0, c0, r1, c1):
+    """
+    The anti-aliased pixels of a segment, computed once for each pair of end points
+    (target skeletons are the same at every logging).
+    :return: the row, column and intensity arrays of line_aa
+    """
+    return line_aa(r0, c0, r1, c1)
+
+
+def draw_skeletons(images, hands):
+    """
+    Draw the skeletons of a batch of hands over their images.
+    Each bone and each joint is drawn over the whole batch with a single scatter,
+    blending the bone colors with anti-aliasing as line_aa does.
+    :param images: a (N, H, W, 3) batch of images with values in [0, 1]
+    :param hands: a (N, 21, 3) batch of hands, as (row, column) relative to the image size and visibility
+    :return: a copy of the images with the skeletons
+    """
+    out = np.array(images)
+    height, width = out.shape[1:3]
+    hands = np.asarray(hands)
+    coords = (hands[:, :, :2] * (height, width)).astype(np.int64)
     green = np.array([0, 1, 0])
     blue = np.array([0, 0, 1])
-    for idx in range(len(hand)):
-        joint = hand[idx]
-        coords = int(joint[0] * outshape[0]), int(joint[1] * outshape[1])
-        for (idx2, col) in SEGMENTS_LIST[idx]:
-            joint2 = hand[idx2]
-            coords2 = int(joint2[0] * outshape[0]), int(joint2[1] * outshape[1])
-            rr, cc, val = line_aa(coords[0], coords[1],
-                                  coords2[0], coords2[1])
-            out[rr, cc] = np.array([col * v + out[r, c] * (1 - v) for (r, c, v) in zip(rr, cc, val)])
-        col = joint[2] * green + (1 - joint[2]) * blue
-        cir = circle(coords[0], coords[1], 2, shape=outshape)
-        out[cir] = col
+
+    def draw_bone(idx, idx2, col):
+        lines = [line_pixels(r0, c0, r1, c1) for (r0, c0), (r1, c1) in
+                 zip(coords[:, idx].tolist(), coords[:, idx2].tolist())]
+        bi = np.repeat(np.arange(len(lines)), [len(rr) for rr, _, _ in lines])
+        rr, cc, val = [np.concatenate(arrs) for arrs in zip(*lines)]
+        # pixels out of the image are not drawn
+        inside = (rr >= 0) & (rr < height) & (cc >= 0) & (cc < width)
+        bi, rr, cc, val = bi[inside], rr[inside], cc[inside], val[inside, None]
+        out[bi, rr, cc] = col * val + out[bi, rr, cc] * (1 - val)
+
+    def draw_joint(idx):
+        rr = coords[:, idx, None, 0] + DOT_OFFSETS[:, 0]
+        cc = coords[:, idx, None, 1] + DOT_OFFSETS[:, 1]
+        bi = np.broadcast_to(np.arange(len(out))[:, None], rr.shape)
+        col = hands[:, idx, 2, None] * green + (1 - hands[:, idx, 2, None]) * blue
+        inside = (rr >= 0) & (rr < height) & (cc >= 0) & (cc < width)
+        out[bi[inside], rr[inside], cc[inside]] = np.broadcast_to(col[:, None], rr.shape + (3,))[inside]
+
+    bones = iter(BONES)
+    bone = next(bones, None)
+    for idx in range(hands.shape[1]):
+        while bone is not None and bone[0] == idx:
+            draw_bone(*bone)
+            bone = next(bones, None)
+        draw_joint(idx)
     return out
 
 
-@batch_tb_logging
+def produce_skeleton_image(img, hand):
+    return draw_skeletons(np.asarray(img)[None], np.asarray(hand)[None])[0]
+
+
 def joint_skeleton_regressor(feed, img_key=IN('img'),
                              joints_key=NET_OUT('joints')):
-    img = feed[img_key]
-    imgmin = np.min(img)
-    imgmax = np.max(img)
-    img = (img - imgmin)/(imgmax-imgmin)
-    joints = feed[joints_key]
+    img = normalized_batch(feed[img_key])
+    joints = np.asarray(feed[joints_key])
 
-    rawhand = np.reshape(joints, newshape=(21, np.size(joints) // 21))
-    if rawhand.shape[1] == 2:
-        rawhand = np.concatenate([rawhand, np.zeros(shape=(21, 1))], axis=1)
-    return produce_skeleton_image(img, rawhand)
+    rawhands = np.reshape(joints, (len(joints), 21, np.size(joints) // (21 * len(joints))))
+    if rawhands.shape[2] == 2:
+        rawhands = np.concatenate([rawhands, np.zeros(shape=rawhands.shape[:2] + (1,))], axis=2)
+    return draw_skeletons(img, rawhands)
 
 
-@batch_tb_logging
 def joint_skeleton_impression(feed, img_key=IN(0),
                               heats_key=NET_OUT(0),
                               vis_key=NET_OUT(1)):
-    img = feed[img_key]
-    imgmin = np.min(img)
-    imgmax = np.max(img)
-    img = (img - imgmin)/(imgmax-imgmin)
-    heats = feed[heats_key]
-    vis = feed[vis_key]
-    hand = heatmaps_to_hand(joints=heats,
-                            visibility=vis)
-    return produce_skeleton_image(img, raw(hand))
+    img = normalized_batch(feed[img_key])
+    hands = heatmaps_to_hands(joints=feed[heats_key],
+                              visibility=feed[vis_key])
+    return draw_skeletons(img, hands)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,21 @@
+import sys
+import os
+sys.path.append(os.path.realpath(os.path.join(os.path.split(__file__)[0], "..")))
+
+from data.datasets.framedata_management.labeling_server import *
+
+# Serve the operations of the other php called scripts from a single process,
+# run it as the web server user (or any user that can write framedata).
+# The php pages fall back to the scripts when the server is not running.
+# Usage: labeling_daemon.py [socket path]
+#        labeling_daemon.py reload [socket path]  (after changing the frame directories)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'reload':
+        request('reload', address=sys.argv[2] if len(sys.argv) > 2 else labeling_socket)
+    else:
+        server = LabelingServer(address=sys.argv[1] if len(sys.argv) > 1 else labeling_socket)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
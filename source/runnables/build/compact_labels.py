@@ -0,0 +1,14 @@
+import sys
+import os
+sys.path.append(os.path.realpath(os.path.join(os.path.split(__file__)[0], "..", "..")))
+
+from data.datasets.framedata_management.utils import list_videos, compact_journal
+
+# Write the label journals of all videos into their frame files
+if __name__ == '__main__':
+    for vidname in list_videos():
+        compacted = compact_journal(vidname)
+        if compacted is None:
+            print("%s: compaction already running, skipped" % vidname)
+        elif compacted > 0:
+            print("%s: %d frames compacted" % (vidname, compacted))
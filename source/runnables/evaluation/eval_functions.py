@@ -1,147 +1,294 @@
-from numba import jit
 import numpy as np
-import tqdm
 import data.datasets.crop.utils as u
 from data.naming import *
 import matplotlib.pyplot as mplt
 
 
+# samples processed at once by the batch metrics, bounds the memory of the intermediate arrays
+CHUNK_SIZE = 256
+DEFAULT_THRESHOLDS = np.linspace(0, 1, 11)
+
+
 def loop_pix_avg_dist(yt, yp):
-    thrs = np.linspace(0, 1, 11)
-    dist = []
-    std = []
-    for thr in thrs:
-        d, s = pixel_avg_dist_euclidean(yt, yp, thr, False)
-        dist.append(d)
-        std.append(s)
+    thrs = DEFAULT_THRESHOLDS
+    dist, std = pixel_avg_dist_batch(yt, yp, thrs)
+    report_pix_avg_dist(thrs, dist, std)
+
+
+def report_pix_avg_dist(thrs, dist, std):
     print("###########")
     print(thrs)
-    print(dist)
-    print(std)
+    print(list(dist))
+    print(list(std))
     plot(thrs, dist, "thresholds", "mean distance", "1.jpg")
     plot(thrs, std, "thresholds", "mean std", "2.jpg")
 
 
 def loop_prec_recall(yt, yp):
-    thrs = np.linspace(0, 1, 11)
-    prec = []
-    reca = []
-    for thr in thrs:
-        prec.append(precision(yt, yp, thr, False))
-        reca.append(recall(yt, yp, thr, False))
+    thrs = DEFAULT_THRESHOLDS
+    prec, reca = precision_recall_batch(yt, yp, thrs)
+    report_prec_recall(thrs, prec, reca)
+
+
+def report_prec_recall(thrs, prec, reca):
     print("###########")
     print("THRS: ", thrs)
-    print("PREC: ", prec)
-    print("RECA: ", reca)
+    print("PREC: ", list(prec))
+    print("RECA: ", list(reca))
     plot(thrs, prec, "thresholds", "precision", "3.jpg")
     plot(thrs, reca, "thresholds", "recall", "4.jpg")
 
 
-@jit
+def heat_stack(heats):
+    """
+    :param heats: a list or array of N heatmaps of shape (H, W) or (H, W, 1)
+    :return: the (N, H, W) float array of the heatmaps
+    """
+    heats = np.asarray(heats, dtype=np.float64)
+    if heats.ndim == 4 and heats.shape[-1] == 1:
+        heats = heats[..., 0]
+    return heats
+
+
+def threshold_bins(values, thrs):
+    """
+    :param values: an array of values
+    :param thrs: the sorted thresholds
+    :return: for each value, the number of thresholds it is greater or equal to
+    """
+    return np.searchsorted(thrs, values, side='right')
+
+
+def per_sample_bincount(bins, nbins, weights=None):
+    """
+    Count (or sum the weights of) the values of each bin, separately for each sample.
+    :param bins: a (N, ...) integer array of bins in [0, nbins)
+    :param nbins: the number of bins
+    :param weights: the optional array of weights, with the shape of bins
+    :return: a (N, nbins) array
+    """
+    n = len(bins)
+    offsets = (np.arange(n) * nbins).reshape((n,) + (1,) * (bins.ndim - 1))
+    return np.bincount((bins + offsets).ravel(),
+                       weights=None if weights is None else weights.ravel(),
+                       minlength=n * nbins).reshape(n, nbins)
+
+
+def at_least(counts):
+    """
+    :param counts: the (N, T + 1) per sample bin counts given by per_sample_bincount of threshold_bins
+    :return: the (N, T) counts of the values greater or equal to each threshold
+    """
+    return np.cumsum(counts[:, ::-1], axis=1)[:, ::-1][:, 1:]
+
+
+def threshold_counts(yt, yp, thrs=DEFAULT_THRESHOLDS):
+    """
+    Count the pixels over each threshold for a whole stack of heatmaps in one pass.
+    As in precision and recall, predicted values are sharpened with 1 - (1 - p)^5 before thresholding.
+    :param yt: the N expected heatmaps
+    :param yp: the N predicted heatmaps
+    :param thrs: the T thresholds
+    :return: three (N, T) arrays with the number of pixels over the threshold
+             in both heatmaps, in the predicted heatmap and in the expected heatmap
+    """
+    thrs = np.sort(np.asarray(thrs, dtype=np.float64))
+    nbins = len(thrs) + 1
+    both, pred, true = [], [], []
+    for start in range(0, len(yt), CHUNK_SIZE):
+        t = heat_stack(yt[start:start + CHUNK_SIZE])
+        p = heat_stack(yp[start:start + CHUNK_SIZE])
+        p = 1 - (1 - p) ** 5
+        tbins = threshold_bins(t, thrs)
+        pbins = threshold_bins(p, thrs)
+        # a pixel is over a threshold in both heatmaps when the lowest of its values is
+        both.append(at_least(per_sample_bincount(np.minimum(tbins, pbins), nbins)))
+        pred.append(at_least(per_sample_bincount(pbins, nbins)))
+        true.append(at_least(per_sample_bincount(tbins, nbins)))
+    return np.concatenate(both), np.concatenate(pred), np.concatenate(true)
+
+
+def per_sample_precision_recall(both, pred, true):
+    """
+    :return: the (N, T) precision and recall of each sample, as precision and recall compute them
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prec = np.where(pred > 0, both / np.maximum(pred, 1), 0.)
+        reca = both / true
+    return prec, reca
+
+
+def precision_recall_from_counts(both, pred, true):
+    """
+    :return: the (T,) mean precision and recall over the samples
+    """
+    prec, reca = per_sample_precision_recall(both, pred, true)
+    return prec.mean(axis=0), reca.mean(axis=0)
+
+
+def precision_recall_batch(yt, yp, thrs=DEFAULT_THRESHOLDS):
+    """
+    Mean precision and recall of a whole stack of heatmaps, for many thresholds at once
+    :param yt: the N expected heatmaps
+    :param yp: the N predicted heatmaps
+    :param thrs: the T thresholds
+    :return: the (T,) arrays of mean precision and mean recall, for the sorted thresholds
+    """
+    return precision_recall_from_counts(*threshold_counts(yt, yp, thrs))
+
+
 def precision(yt, yp, thr=0.5, verb=True):
-    yt = np.array(yt)
-    yp = np.array(yp)
-    ris = []
-    for i in tqdm.tqdm(range(len(yt))):
-        ris.append(__precision(yp[i], yt[i], thr))
-    ris = np.array(ris)
+    ris = precision_recall_batch(yt, yp, [thr])[0][0]
     if verb:
         print("##############")
-        print("PRECISION: ", ris.mean())
-    return ris.mean()
-
+        print("PRECISION: ", ris)
+    return ris
 
-@jit
-def __precision(h1, h2, thr):
-    h1 = 1 - (1 - h1)**5
-    h1[h1 >= thr] = 1
-    h2[h2 >= thr] = 1
-    h1[h1 < thr] = 0
-    h2[h2 < thr] = 0
-    if np.sum(h1) == 0:
-        return 0
-    return np.sum(h1*h2)/np.sum(h1)
 
-
-@jit
 def recall(yt, yp, thr=0.5, verb=True):
-    yt = np.array(yt)
-    yp = np.array(yp)
-    ris = []
-    for i in tqdm.tqdm(range(len(yt))):
-        ris.append(__recall(yp[i], yt[i], thr))
-    ris = np.array(ris)
+    ris = precision_recall_batch(yt, yp, [thr])[1][0]
     if verb:
         print("##############")
-        print("RECALL: ", ris.mean())
-    return ris.mean()
+        print("RECALL: ", ris)
+    return ris
 
 
-@jit
-def __recall(h1, h2, thr):
-    h1 = 1 - (1 - h1) ** 5
-    h1[h1 >= thr] = 1
-    h2[h2 >= thr] = 1
-    h1[h1 < thr] = 0
-    h2[h2 < thr] = 0
-    return np.sum(h1*h2)/np.sum(h2)
+def heatmap_centroids(heats):
+    """
+    :param heats: the N heatmaps
+    :return: the (N, 2) weighted centroids (row, column) of the heatmaps, NaN for empty heatmaps
+    """
+    heats = heat_stack(heats)
+    n = heats.sum(axis=(1, 2))
+    rows = (heats.sum(axis=2) * np.arange(heats.shape[1])).sum(axis=1)
+    cols = (heats.sum(axis=1) * np.arange(heats.shape[2])).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(n[:, None] != 0, np.stack((rows, cols), axis=1) / n[:, None], np.nan)
 
 
-def pixel_avg_dist_euclidean(yt, yp, thr=0.5, verb=True):
-    yp = np.array(yp)
+def thresholded_centroids(heats, thrs=DEFAULT_THRESHOLDS):
+    """
+    Centroids of the heatmaps after setting to 1 the values over each threshold,
+    as pixel_avg_dist_euclidean does, for many thresholds in one pass.
+    :param heats: the N heatmaps
+    :param thrs: the T thresholds
+    :return: the (N, T, 2) centroids, NaN for empty heatmaps
+    """
+    thrs = np.sort(np.asarray(thrs, dtype=np.float64))
+    nbins = len(thrs) + 1
+    heats = heat_stack(heats)
+    bins = threshold_bins(heats, thrs)
+    rows = np.broadcast_to(np.arange(heats.shape[1])[None, :, None], heats.shape)
+    cols = np.broadcast_to(np.arange(heats.shape[2])[None, None, :], heats.shape)
+    sums = []
+    for weights in (heats, heats * rows, heats * cols, None, rows, cols):
+        per_bin = per_sample_bincount(bins, nbins, weights=None if weights is None else np.asarray(weights, dtype=np.float64))
+        # values under the threshold k keep their weight, values over it count as 1
+        under = np.cumsum(per_bin, axis=1)[:, :-1]
+        sums.append((under, at_least(per_bin)))
+    (w_under, _), (r_under, _), (c_under, _), (_, n_over), (_, r_over), (_, c_over) = sums
+    n = w_under + n_over
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centroids = np.stack(((r_under + r_over) / n, (c_under + c_over) / n), axis=2)
+    centroids[n == 0] = np.nan
+    return centroids
+
+
+def centroid_distances(yt, yp, thrs=DEFAULT_THRESHOLDS):
+    """
+    :return: the (N, T) distances between expected and thresholded predicted centroids, NaN where undefined
+    """
     dists = []
-    for i in tqdm.tqdm(range(len(yt))):
-        try:
-            yp[i][yp[i] >= thr] = 1
-            tcx, tcy = __heatmap_centroid(yt[i])
-            pcx, pcy = __heatmap_centroid(yp[i])
-            dist = np.sqrt(((tcx - pcx)**2) + ((tcy - pcy)**2))
-            dists.append(dist)
-        except Exception:
-            continue
-    dists = np.array(dists)
+    for start in range(0, len(yt), CHUNK_SIZE):
+        tc = heatmap_centroids(yt[start:start + CHUNK_SIZE])
+        pc = thresholded_centroids(yp[start:start + CHUNK_SIZE], thrs)
+        dists.append(np.linalg.norm(pc - tc[:, None, :], axis=2))
+    return np.concatenate(dists)
+
+
+def pixel_avg_dist_batch(yt, yp, thrs=DEFAULT_THRESHOLDS):
+    """
+    Mean and standard deviation of the centroid distances, for many thresholds at once.
+    Samples with an empty heatmap are skipped, as in pixel_avg_dist_euclidean.
+    :return: the (T,) arrays of mean and std of the distances, for the sorted thresholds
+    """
+    dists = centroid_distances(yt, yp, thrs)
+    return np.nanmean(dists, axis=0), np.nanstd(dists, axis=0)
+
+
+def pixel_avg_dist_euclidean(yt, yp, thr=0.5, verb=True):
+    mean, std = pixel_avg_dist_batch(yt, yp, [thr])
     if verb:
         print("##############")
-        print("MEAN CENTROIDS PIXEL DISTANCE: ", dists.mean())
-        print("STD CENTROIDS PIXEL DISTANCE: ", dists.std())
-    return dists.mean(), dists.std()
+        print("MEAN CENTROIDS PIXEL DISTANCE: ", mean[0])
+        print("STD CENTROIDS PIXEL DISTANCE: ", std[0])
+    return mean[0], std[0]
+
+
+class StreamingMetrics:
+    """
+    Precision, recall and centroid distances for many thresholds, accumulated batch by batch,
+    so that a validation set can be evaluated without keeping all its predictions.
+    Results are the same of precision_recall_batch and pixel_avg_dist_batch on the whole set.
+    """
+    def __init__(self, thrs=DEFAULT_THRESHOLDS):
+        """
+        :param thrs: the T thresholds
+        """
+        self.thrs = np.sort(np.asarray(thrs, dtype=np.float64))
+        self.samples = 0
+        self.prec_sum = np.zeros(len(self.thrs))
+        self.reca_sum = np.zeros(len(self.thrs))
+        self.dist_count = np.zeros(len(self.thrs))
+        self.dist_sum = np.zeros(len(self.thrs))
+        self.dist_sq_sum = np.zeros(len(self.thrs))
+
+    def update(self, yt, yp):
+        """
+        :param yt: the expected heatmaps of a batch
+        :param yp: the predicted heatmaps of the batch
+        """
+        prec, reca = per_sample_precision_recall(*threshold_counts(yt, yp, self.thrs))
+        self.samples += len(prec)
+        self.prec_sum += prec.sum(axis=0)
+        self.reca_sum += reca.sum(axis=0)
+        dists = centroid_distances(yt, yp, self.thrs)
+        valid = ~np.isnan(dists)
+        dists = np.where(valid, dists, 0.)
+        self.dist_count += valid.sum(axis=0)
+        self.dist_sum += dists.sum(axis=0)
+        self.dist_sq_sum += (dists ** 2).sum(axis=0)
+
+    def precision_recall(self):
+        """
+        :return: the (T,) arrays of mean precision and mean recall
+        """
+        return self.prec_sum / self.samples, self.reca_sum / self.samples
+
+    def pixel_avg_dist(self):
+        """
+        :return: the (T,) arrays of mean and std of the centroid distances
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = self.dist_sum / self.dist_count
+            std = np.sqrt(np.maximum(self.dist_sq_sum / self.dist_count - mean ** 2, 0))
+        return mean, std
+
+    def report(self):
+        report_pix_avg_dist(self.thrs, *self.pixel_avg_dist())
+        report_prec_recall(self.thrs, *self.precision_recall())
 
 
 def percentage_overlap(yt, yp, thr=0.5):
-    yp = np.array(yp)
-    yt = np.array(yt)
-    yp = np.array(yp)
+    yt = heat_stack(yt)
+    yp = heat_stack(yp)
     print(yt.shape, yp.shape)
-    ris = []
-    for i in tqdm.tqdm(range(len(yt))):
-        ris.append(__percentage_overlap(yp[i], yt[i], thr))
-    ris = np.array(ris)
+    yp = np.where(yp > thr, 1., yp)
+    ris = (yp * yt).sum(axis=(1, 2)) / yt.sum(axis=(1, 2))
     print("##############")
     print("PERC OVERLAP: ", ris.mean())
 
 
-@jit
-def __percentage_overlap(h1, h2, thr):
-    h1[h1 > thr] = 1
-    return np.sum(h1*h2)/np.sum(h2)
-
-
-@jit
-def __heatmap_centroid(heat):
-    heat = heat.squeeze()
-    acc_x = 0
-    acc_y = 0
-    n = 0
-    for i in range(heat.shape[0]):
-        for j in range(heat.shape[1]):
-            acc_x += i * heat[i][j]
-            acc_y += j * heat[i][j]
-            n += heat[i][j]
-    if n == 0:
-        raise Exception
-    return acc_x/n, acc_y/n
-
-
 def create_sprite(n, f, h, num=1):
     path = resources_path(os.path.join("saves_for_report", "sprite"))
     os.makedirs(path, exist_ok=True)
@@ -1,16 +1,18 @@
 import os
 from data.naming import *
-from library.neural_network import heatmap
+from library.neural_network import frozen_heatmap
 from runnables.evaluation.eval_functions import *
 from data.datasets.crop.hands_locator_from_rgbd import create_dataset_shaded_heatmaps as cropscreate, read_dataset
-from data.datasets.crop.jsonhands_dataset_manager import create_dataset_shaded_heatmaps_synth as jsonscreate, read_dataset as jsonread
+from data.datasets.crop.jsonhands_dataset_manager import create_dataset_shaded_heatmaps_synth as jsonscreate, read_dataset as jsonread, read_dataset_batches
+from library.multi_threading import prefetched
+from library.tracking.preprocessing import FramePreprocessor
 from skimage.transform import resize
 import tqdm
 
 
 # ###### TOUCH ########
 def model():
-    return heatmap()
+    return frozen_heatmap()
 
 
 # TEST DATASET PATH
@@ -20,13 +22,17 @@ test_ds_path = jsonhands_path()
 # cropscreate(savepath=test_ds_path, fillgaps=False, resize_rate=0.5, width_shrink_rate=4, heigth_shrink_rate=4)
 # jsonscreate(dspath=resources_path(os.path.join("hand_labels_synth", "synth2")), savepath=test_ds_path, resize_rate=0.5, width_shrink_rate=4, heigth_shrink_rate=4)
 
-# AFTER THIS, x AND y HAVETO BE THE INPUT AND EXPECTED OUTPUT OF THE NET
-x, y = jsonread(test_ds_path)
+# THE TEST SET IS STREAMED FROM DISK IN BATCHES OF THIS SIZE, WHILE THE NETWORK PREDICTS THE PREVIOUS ONES
+batch_size = 32
+# NUMBER OF BATCHES READ AND PREPROCESSED IN ADVANCE
+prefetch_depth = 2
 
 # EVENTUAL PREPROCESS FUNs. THIS  WILL BE APPLIED TO EACH SAMPLE BEFORE BEING FED TO THE NETWORK
+x_preprocessor = FramePreprocessor(output_shape=(224, 224), bgr=False, equalize=False, mobilenet_input=False)
+
+
 def preprocess_x(samp):
-    samp = resize(samp, output_shape=(224, 224, 3))
-    return np.expand_dims(samp, axis=0)
+    return x_preprocessor(samp)
 
 
 def preprocess_y(samp):
@@ -37,27 +43,27 @@ def preprocess_y(samp):
     return samp
 
 
-# THOSE HAVE TO BE FUNCTIONS THAT TAKE AS INPUT TWO ARRAYS: Y_TRUE, Y_PRED (IN THIS ORDER!!)
-# Y_TRUE AND Y_PRED ARE RESPECTIVELY ALL THE EXPECTED OUTPUTS AND ACTUAL OUTPUTS OF THE NETWORK
-# NOTHING IS DONE WITH EVENTUAL RETURN VALUES. IF YOU HAVE SOMETHING TO PRINT, PRINT IT IN THE FUNCTION, OKAY?
-analysis = [loop_pix_avg_dist, loop_prec_recall]
+# METRICS ARE ACCUMULATED BATCH BY BATCH, FOR ALL THESE THRESHOLDS AT ONCE
+metrics = StreamingMetrics(thrs=np.linspace(0, 1, 11))
 
 
 # ###### DONT TOUCH ######
+def batches():
+    # runs in the loading thread: reading and preprocessing overlap with inference
+    for frames, heatmaps in read_dataset_batches(test_ds_path, batch_size=batch_size):
+        xb = np.concatenate([preprocess_x(frame) for frame in frames])
+        yb = np.array([preprocess_y(heatmap) for heatmap in heatmaps])
+        yield xb, yb
+
+
 net = model()
 
-yp = []
-yt = []
-xt = []
-for i in tqdm.tqdm(range(len(x))):
-    sample = x[i]
-    yt.append(preprocess_y(y[i]))
-    sample = preprocess_x(sample)
-    xt.append(sample[0])
-    yp.append(net.predict(sample).squeeze())
-
-for eval_fun in analysis:
-    eval_fun(yt, yp)
+for xb, yb in tqdm.tqdm(prefetched(batches(), depth=prefetch_depth),
+                        total=int(np.ceil(len(os.listdir(test_ds_path)) / batch_size))):
+    yp = net.predict(xb).reshape(yb.shape)
+    metrics.update(yb, yp)
+
+metrics.report()
 
 
 '''
@@ -4,7 +4,7 @@ import cv2
 import sys
 import os
 sys.path.append(os.path.realpath(os.path.join(os.path.split(__file__)[0], "..", "..")))
-from library.neural_network import heatmap, preprocess_input
+from library.neural_network import frozen_heatmap, preprocess_input
 from skimage.transform import resize
 from library.utils.visualization_utils import get_image_with_mask
 import numpy as np
@@ -28,7 +28,7 @@ def preprocess_frame(frame):
 
 
 if __name__ == '__main__':
-    net = heatmap()
+    net = frozen_heatmap()
 
     cap = cv2.VideoCapture(0)  # Capture video from camera
 
@@ -2,19 +2,17 @@ import cv2
 import sys
 import os
 sys.path.append(os.path.realpath(os.path.join(os.path.split(__file__)[0], "..", "..")))
-from library.neural_network import heatmap, preprocess_input
-from skimage.transform import resize
+from library.neural_network import frozen_heatmap, HEATMAP_STRIDE
 from library.utils.visualization_utils import get_image_with_mask
 import numpy as np
 from library.utils.hsv import rgb2hsv, hsv2rgb
 from library.load_management.operational_module import OperationalModule, NoOutputException
+from library.tracking.roi_tracker import RoiTracker, crop, roi_input_shape, FULL_FRAME
+from library.tracking.positions import extract_positions
+from library.tracking.preprocessing import FramePreprocessor
 from time import time
 
-from skimage.segmentation import clear_border
-from skimage.measure import label, regionprops
-from skimage.morphology import closing, disk
 from skimage.draw import polygon_perimeter
-from skimage.exposure import equalize_hist as equalize
 
 
 def build_border(bbox, frameshape):
@@ -27,40 +25,29 @@ def build_border(bbox, frameshape):
     return polygon_perimeter(rows, cols, shape=frameshape, clip=True)
 
 
-def preprocess_frame(frame):
-    _frame = resize(frame, output_shape=(224, 224))
-    _frame = np.flip(_frame, axis=2)
-    _frame = equalize(_frame)
-    _frame = np.expand_dims(_frame, axis=0)
-    _frame = preprocess_input(_frame * 255)
-    return _frame
+frame_preprocessor = FramePreprocessor(output_shape=(224, 224))
 
 
-def extract_position(input, output):
-    output = output[0, :, :, 0]
-    bw = closing(output > 0.15, disk(5))
-
-    # remove artifacts connected to image border
-    cleared = clear_border(bw)
+def preprocess_frame(frame, roi=FULL_FRAME):
+    """
+    :param frame: the frame, or its crop to the region of interest
+    :param roi: the normalized region of interest the frame was cropped to
+    :return: the network input, at the scale the whole frame has at 224x224
+    """
+    return frame_preprocessor(frame, output_shape=roi_input_shape(roi, stride=HEATMAP_STRIDE))
 
-    # label image regions
-    label_image = label(cleared)
 
-    # extract the greatest area label
-    areas = sorted(regionprops(label_image), key=lambda x: x.area)
-    if not len(areas):
-        raise NoOutputException
-    maxarea = areas[-1]
-    if maxarea.area < 20:
+def extract_position(input, output):
+    # region of interest heatmaps keep the full frame scale: post-processing parameters are not rescaled
+    bboxes, centroids, valid = extract_positions(output[:, :, :, 0], reference_size=np.sqrt(np.prod(output.shape[1:3])))
+    if not valid[0]:
         raise NoOutputException
-    bbox = np.array(maxarea.bbox).reshape(2, 2).T
-    outputshape = np.array(output.shape[:2])
-    bbox = np.divide(bbox, outputshape[:, None].T)
-    return bbox
+    return bboxes[0]
 
 
 if __name__ == '__main__':
-    net = heatmap()
+    # fully convolutional: regions of interest are fed at a smaller input size, and cost less
+    net = frozen_heatmap(variable_input=True)
 
     cap = cv2.VideoCapture(0)  # Capture video from camera
 
@@ -73,20 +60,39 @@ if __name__ == '__main__':
 
     recording = False
     working_frequency = 50.0
+    # the net runs on the whole frame at least once every redetect_period frames,
+    # otherwise only on the region predicted from the previous positions
+    redetect_period = 15
+    roi_tracker = RoiTracker(redetect_period=redetect_period)
 
     def provide_cap(time):
         ret, frame = cap.read()
         if ret:
-            return [preprocess_frame(cv2.flip(frame, 1))], {}
+            roi_frame, roi = crop(cv2.flip(frame, 1), roi_tracker.next_roi(time))
+            return [preprocess_frame(roi_frame, roi)], {'roi': roi, 'time': time}
         return None
 
-    tracker = OperationalModule(func=net.predict, workers=100,
+    def predict_roi(frame, roi, time):
+        return net.predict(frame)
+
+    def track_position(input, output):
+        roi, time = input[1]['roi'], input[1]['time']
+        try:
+            bbox = extract_position(input, output)
+        except NoOutputException:
+            roi_tracker.lost(time)
+            raise
+        return roi_tracker.update(roi, bbox, time)
+
+    tracker = OperationalModule(func=predict_roi, workers=100,
                                 input_source=provide_cap,
-                                output_adapter=extract_position,
+                                output_adapter=track_position,
                                 working_frequency=working_frequency,
                                 interp_order=1,
-                                interp_samples=4)
+                                interp_samples=4,
+                                name="heatmap")
     tracker.start()
+    tracker.report_metrics(period=5.0)
     while cap.isOpened():
         ret, frame = cap.read()
         if ret:
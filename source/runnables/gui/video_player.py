@@ -44,9 +44,9 @@ if __name__ == '__main__':
                 frames, labels, indexes = load_labeled_video(split[0], getdepth=True, gapflags=True)
                 isdepth = True
             elif split[1] == ".rgb":
-                frames, labels, indexes = load_labeled_video(split[0], gapflags=True)
+                frames, labels, indexes = load_labeled_video(split[0], gapflags=True, lazy=True)
             else:
-                frames, labels, indexes = load_labeled_video(vidname, gapflags=True)
+                frames, labels, indexes = load_labeled_video(vidname, gapflags=True, lazy=True)
         except FileNotFoundError:
             isdepth = False
             try:
@@ -93,8 +93,8 @@ if __name__ == '__main__':
         #     filter = make_bluescreen_filter(frames[idx])
         #     frames[idx, filter] = bkg[idx, filter]
 
-        image_width = np.shape(frames)[2]
-        image_height = np.shape(frames)[1]
+        image_width = np.shape(frames[0])[1]
+        image_height = np.shape(frames[0])[0]
 
         topframe = Frame(root, height=image_height, width=cmd_width + image_width)
         topframe.pack(side=TOP)
@@ -202,7 +202,7 @@ if __name__ == '__main__':
         slider.set(1)
         slider.pack(side=BOTTOM, fill=BOTH)
         frameslider = Scale(root,
-                            from_=0, to=np.shape(frames)[0] - 1, resolution=1,
+                            from_=0, to=len(frames) - 1, resolution=1,
                             orient=HORIZONTAL, tickinterval=20.0,
                             command=lambda v: player.set_current_frame(int(v)))
         frameslider.set(0)
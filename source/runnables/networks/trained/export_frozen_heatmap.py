@@ -0,0 +1,45 @@
+import os
+import sys
+
+sys.path.append(os.path.realpath(os.path.join(os.path.split(__file__)[0], "..", "..", "..")))
+
+import numpy as np
+from library.neural_network.keras.trained_models.heatmap import heatmap, frozen_model_path, quantized_model_path, \
+    variable_frozen_model_path
+from library.neural_network.keras.trained_models.frozen import freeze_model, FrozenModel, inference_benchmark
+
+if __name__ == '__main__':
+    # export both the plain frozen graph and the one with quantized weights
+    freeze_model(heatmap, frozen_model_path)
+    freeze_model(heatmap, quantized_model_path, quantize=True)
+    # fully convolutional export, fed with regions of interest by the live pipeline
+    freeze_model(lambda: heatmap(variable_input=True), variable_frozen_model_path)
+
+    repeat = 100
+    models = {'keras': heatmap(),
+              'frozen': FrozenModel(frozen_model_path),
+              'quantized': FrozenModel(quantized_model_path),
+              'variable': FrozenModel(variable_frozen_model_path)}
+
+    # exports must agree with the original model before being worth deploying
+    x = np.random.uniform(low=-1, high=1, size=(4, 224, 224, 3)).astype(np.float32)
+    reference = models['keras'].predict(x)
+    for name in ['frozen', 'quantized', 'variable']:
+        print("Max abs difference %s vs keras: %f" % (name, np.max(np.abs(models[name].predict(x) - reference))))
+
+    times = inference_benchmark(models, input_shape=(224, 224, 3), repeat=repeat)
+    for name, tms in times.items():
+        print("-------------------------------------")
+        print("Results for %s:" % name)
+        print("Average call execution time: %f" % np.average(tms))
+        print("Maximum call execution time: %f" % np.max(tms))
+        print("Minimum call execution time: %f" % np.min(tms))
+        print("Call execution time variance: %f" % np.var(tms))
+        print("Total calls: %d" % len(tms))
+
+    # the cost of the variable input export on the regions of interest of the live pipeline
+    variable = {'variable': models['variable']}
+    for side in [224, 160, 112, 80, 64]:
+        tms = inference_benchmark(variable, input_shape=(side, side, 3), repeat=repeat)['variable']
+        print("Variable input %dx%d: average call execution time %f (%.1f Hz)" % (side, side, np.average(tms),
+                                                                                   1 / np.average(tms)))
@@ -0,0 +1,29 @@
+<?php
+    include_once 'local_paths.php';
+
+    // Run an operation of the labeling server (source/php_called_scripts/labeling_daemon.py).
+    // If the server can not be reached, run the corresponding php called script instead.
+    // As exec, return the last output line and set the output lines and the error code.
+    function labeling_call($op, $args, $script, &$rets, &$errorcode){
+        global $script_base, $python_interpreter, $labeling_socket;
+        $rets = array();
+        $fp = @stream_socket_client("unix://".$labeling_socket, $errno, $errstr, 5);
+        if ($fp){
+            // the server may have run the operation even without a reply:
+            // running the script too could do it twice (ex: two frames reserved)
+            fwrite($fp, json_encode(array("op" => $op, "args" => $args))."\n");
+            $response = json_decode(fgets($fp), true);
+            fclose($fp);
+            if ($response === null){
+                $rets = array("Error: no valid reply from the labeling server");
+                $errorcode = 1;
+                return end($rets);
+            }
+            $rets = $response["out"];
+            $errorcode = $response["ok"] ? 0 : 1;
+            return count($rets) > 0 ? end($rets) : "";
+        }
+        $cmd = $python_interpreter." ".$script_base."source/php_called_scripts/".$script." ".implode(" ", $args)." 2>&1";
+        return exec($cmd, $rets, $errorcode);
+    }
+?>
\ No newline at end of file
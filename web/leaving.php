@@ -1,15 +1,12 @@
 <?php
-    include 'local_paths.php';
+    include 'labeling.php';
     $frame = $_POST["framename"];
 
-    $script = "source/php_called_scripts/uncache_frame.py";
-    $args = $frame." 2>&1";
-    $cmd = $python_interpreter." ".$script_base.$script." ".$args;
-    $out = exec($cmd, $rets, $errorcode);
+    $out = labeling_call("uncache_frame", array($frame), "uncache_frame.py", $rets, $errorcode);
 
     if ($errorcode == 0 && $out == ""){
         echo "OK";
     }else{
-        echo $cmd."\n\n".$out;
+        echo "uncache_frame ".$frame."\n\n".$out;
     }
 ?>
\ No newline at end of file
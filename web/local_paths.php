@@ -1,4 +1,5 @@
 <?php
     $script_base = "/home/gianpaolo/HandTracking/";
     $python_interpreter = "/home/gianpaolo/miniconda3/envs/server/bin/python";
+    $labeling_socket = $script_base."resources/framedata/labeling.sock";
 ?>
\ No newline at end of file
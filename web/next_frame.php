@@ -1,8 +1,5 @@
 <?php
-    include 'local_paths.php';
-    $script = "source/php_called_scripts/get_frame.py";
-    $args = "2>&1";
-    $cmd = $python_interpreter." ".$script_base.$script." ".$args;
-    $out = exec($cmd, $rets, $errorcode);
+    include 'labeling.php';
+    $out = labeling_call("get_frame", array(), "get_frame.py", $rets, $errorcode);
     echo $out;
 ?>
\ No newline at end of file
@@ -6,11 +6,8 @@
    </head>
 
    <?php
-        include 'local_paths.php';
-        $script = "source/php_called_scripts/get_frame.py";
-        $args = "2>&1";
-        $cmd = $python_interpreter." ".$script_base.$script." ".$args;
-        $out = exec($cmd, $rets, $errorcode);
+        include 'labeling.php';
+        $out = labeling_call("get_frame", array(), "get_frame.py", $rets, $errorcode);
         if ($errorcode == 0){
             $error = "";
             $imgurl = $out;
@@ -18,10 +15,7 @@
             $error = $out;
         }
 
-        $script = "source/php_called_scripts/get_index_content.py";
-        $args = $imgurl." 2>&1";
-        $cmd = $python_interpreter." ".$script_base.$script." ".$args;
-        $index = exec($cmd, $rets, $errorcode);
+        $index = labeling_call("get_index_content", array($imgurl), "get_index_content.py", $rets, $errorcode);
 
         $nick = $_GET["nick"]
    ?>
@@ -1,8 +1,5 @@
 <?php
-    include 'local_paths.php';
-    $script = "source/php_called_scripts/get_index_content.py";
-    $args = $_POST["framename"]." 2>&1";
-    $cmd = $python_interpreter." ".$script_base.$script." ".$args;
-    $out = exec($cmd, $rets, $errorcode);
+    include 'labeling.php';
+    $out = labeling_call("get_index_content", array($_POST["framename"]), "get_index_content.py", $rets, $errorcode);
     echo $out;
 ?>
\ No newline at end of file
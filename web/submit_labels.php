@@ -1,17 +1,14 @@
 <?php
-    include 'local_paths.php';
+    include 'labeling.php';
     $frame = $_POST["framename"];
     $labels = $_POST["labels"];
     $nick = $_POST["nick"];
 
-    $script = "source/php_called_scripts/register_labels.py";
-    $args = $labels." ".$frame." ".$nick." 2>&1";
-    $cmd = $python_interpreter." ".$script_base.$script." ".$args;
-    $out = exec($cmd, $rets, $errorcode);
+    $out = labeling_call("register_labels", array($labels, $frame, $nick), "register_labels.py", $rets, $errorcode);
 
     if ($errorcode == 0 && $out == ""){
         echo "OK";
     }else{
-        echo $cmd."\n\n".$out;
+        echo "register_labels ".$frame."\n\n".$out;
     }
 ?>
\ No newline at end of file
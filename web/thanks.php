@@ -6,11 +6,8 @@
    </head>
 
       <?php
-        include 'local_paths.php';
-        $script = "source/php_called_scripts/contributors.py";
-        $args = "2>&1";
-        $cmd = $python_interpreter." ".$script_base.$script." ".$args;
-        $out = exec($cmd, $rets, $errorcode);
+        include 'labeling.php';
+        $out = labeling_call("contributors", array(), "contributors.py", $rets, $errorcode);
       ?>
 
    <body>